@@ -0,0 +1,123 @@
+import numpy as np
+
+# Dormand-Prince 5(4) tableau for autonomous systems, the 7th stage is evaluated at the accepted point (FSAL)
+A = [
+    np.array([]),
+    np.array([1 / 5]),
+    np.array([3 / 40, 9 / 40]),
+    np.array([44 / 45, -56 / 15, 32 / 9]),
+    np.array([19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729]),
+    np.array([9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656]),
+]
+B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84])
+E = np.array([-71 / 57600, 0, 71 / 16695, -71 / 1920, 17253 / 339200, -22 / 525, 1 / 40])
+# Coefficients of the 4th order continuous extension, y(t + theta*h) = y + h * K^T P [theta, theta^2, theta^3, theta^4]
+P = np.array([
+    [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+    [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+    [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+    [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+    [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423],
+])
+
+SAFETY = 0.9
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10.0
+
+
+class Dense_Output():
+
+    def __init__(self, t_nodes, y_nodes, h_values, q_values, steps, rejected):
+        self.t_nodes = t_nodes
+        self.y_nodes = y_nodes
+        self.h_values = h_values
+        self.q_values = q_values
+        self.steps = steps
+        self.rejected = rejected
+
+    def __call__(self, t_values):
+        t_values = np.asarray(t_values, dtype=float)
+        idx = np.searchsorted(self.t_nodes, t_values, side='right') - 1
+        idx = np.clip(idx, 0, len(self.h_values) - 1)
+        theta = (t_values - self.t_nodes[idx]) / self.h_values[idx]
+        powers = np.stack([theta, theta ** 2, theta ** 3, theta ** 4], axis=-1)
+        return self.y_nodes[idx] + self.h_values[idx][:, None] * np.einsum('nij,nj->ni', self.q_values[idx], powers)
+
+    def sample(self, t_start, t_end, num_samples):
+        t_values = np.linspace(t_start, t_end, num_samples)
+        return t_values, self(t_values)
+
+
+def rms_norm(x):
+    return np.sqrt(np.mean(x * x))
+
+
+def initial_step(rhs, y0, f0, rtol, atol):
+    scale = atol + np.abs(y0) * rtol
+    d0 = rms_norm(y0 / scale)
+    d1 = rms_norm(f0 / scale)
+    h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+    f1 = rhs(y0 + h0 * f0)
+    d2 = rms_norm((f1 - f0) / scale) / h0
+    if max(d1, d2) <= 1e-15:
+        h1 = max(1e-6, h0 * 1e-3)
+    else:
+        h1 = (0.01 / max(d1, d2)) ** (1 / 5)
+    return min(100 * h0, h1)
+
+
+def dormand_prince(rhs, y0, t_start, t_end, rtol=1e-6, atol=1e-9, max_steps=10 ** 7):
+    if t_end < t_start:
+        raise ValueError("Dormand-Prince integrates forward in time only, t_end must not be below t_start")
+    y = np.array(y0, dtype=float)
+    t = float(t_start)
+    t_end = float(t_end)
+    f = rhs(y)
+    h = initial_step(rhs, y, f, rtol, atol)
+    k = np.empty((7, y.size))
+
+    t_nodes = [t]
+    y_nodes = [y]
+    h_values = []
+    q_values = []
+    steps = 0
+    rejected = 0
+
+    while t < t_end:
+        if steps + rejected >= max_steps:
+            raise RuntimeError(f"Dormand-Prince exceeded {max_steps} steps before reaching t={t_end}")
+        dt = min(h, t_end - t)
+        k[0] = f
+        for s in range(1, 6):
+            k[s] = rhs(y + dt * (A[s] @ k[:s]))
+        y_new = y + dt * (B @ k[:6])
+        f_new = rhs(y_new)
+        k[6] = f_new
+
+        scale = atol + np.maximum(np.abs(y), np.abs(y_new)) * rtol
+        error = rms_norm(dt * (E @ k) / scale)
+        if error <= 1:
+            factor = MAX_FACTOR if error == 0 else min(MAX_FACTOR, SAFETY * error ** (-1 / 5))
+            h_values.append(dt)
+            q_values.append(k.T @ P)
+            t = t + dt
+            y = y_new
+            f = f_new
+            t_nodes.append(t)
+            y_nodes.append(y)
+            steps += 1
+        else:
+            factor = max(MIN_FACTOR, SAFETY * error ** (-1 / 5))
+            rejected += 1
+        h = dt * factor
+
+    if not h_values:
+        h_values.append(1.0)
+        q_values.append(np.zeros((y.size, 4)))
+        t_nodes.append(t + 1.0)
+        y_nodes.append(y)
+
+    return Dense_Output(np.array(t_nodes[:-1]), np.array(y_nodes[:-1]), np.array(h_values), np.array(q_values),
+                        steps, rejected)
@@ -0,0 +1,72 @@
+import numpy as np
+
+DEFAULT_FPS = 30
+DEFAULT_TRAIL = 2000
+DEFAULT_STEPS_PER_FRAME = 10
+MAX_FPS = 120
+
+
+class Trail_Buffer():
+    # The last capacity rows of a run in a fixed ring. Appending overwrites the oldest rows in place and ordered()
+    # copies into a second preallocated array, so memory and cost per frame do not grow with the length of the run.
+    def __init__(self, capacity=DEFAULT_TRAIL, columns=4):
+        self.capacity = capacity
+        self.data = np.empty((capacity, columns))
+        self.output = np.empty((capacity, columns))
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, rows):
+        rows = rows[-self.capacity:]
+        count = len(rows)
+        end = self.head + count
+        if end <= self.capacity:
+            self.data[self.head:end] = rows
+        else:
+            first = self.capacity - self.head
+            self.data[self.head:] = rows[:first]
+            self.data[:count - first] = rows[first:]
+        self.head = end % self.capacity
+        self.count = min(self.count + count, self.capacity)
+
+    def ordered(self):
+        # Oldest row first. Until the ring wraps the rows already are in order and are returned as a view.
+        if self.count < self.capacity:
+            return self.data[:self.count]
+        first = self.capacity - self.head
+        self.output[:first] = self.data[self.head:]
+        self.output[first:] = self.data[:self.head]
+        return self.output
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+
+class Animation_Stepper():
+    # Advances one system by steps_per_frame RK4 steps per call from a float64 state, with no end time. Rows come
+    # out as (t, x, y, z), times are computed from the step count so they do not drift over long demos.
+    def __init__(self, eq_handler, system, initial_conditions, t_start, dt, steps_per_frame=DEFAULT_STEPS_PER_FRAME):
+        self.eq_handler = eq_handler
+        self.system = system
+        self.t_start = t_start
+        self.dt = dt
+        self.state = np.array(initial_conditions, dtype=float)
+        self.steps = 0
+        self.xyz = np.empty((steps_per_frame + 1, 3))
+        self.rows = np.empty((steps_per_frame + 1, 4))
+
+    def advance(self):
+        self.xyz[0] = self.state
+        self.eq_handler.runge_kutta_fill(self.system, self.xyz, self.dt, 1, self.state)
+        count = len(self.xyz)
+        self.rows[:, 0] = self.t_start + (self.steps + np.arange(count)) * self.dt
+        self.rows[:, 1:] = self.xyz
+        self.steps += count - 1
+        if not np.isfinite(self.state).all():
+            raise ArithmeticError(f"The trajectory diverged after {self.steps} steps")
+        # row 0 is the last state of the previous frame
+        return self.rows[1:]
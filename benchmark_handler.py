@@ -0,0 +1,159 @@
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RK4_STEPS = (1000, 10000, 100000)
+LONG_RUN_STEPS = 1000000
+LONG_RUN_STRIDE = 10
+PLOT_SAMPLES = (10000, 100000, 1000000)
+TERMINAL_LINES = (1000, 100000)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+
+
+def measure(function, repeat):
+    # One untimed call first, so numba compilation and first-draw setup are not part of the numbers
+    function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings), 'mean': statistics.fmean(timings),
+            'repeat': repeat}
+
+
+def integrator_cases(backend=None):
+    from equation_handler import Eq_Handler
+
+    eq_handler = Eq_Handler()
+    if backend:
+        eq_handler.set_backend(backend)
+    eq_handler.set_lorenz_conditions(28.0, 8 / 3, 10.0)
+    eq_handler.set_roessler_conditions(0.1, 0.1, 14.0)
+    for num_steps in RK4_STEPS:
+        yield f'rk4_lorenz_N{num_steps}', \
+            lambda n=num_steps: eq_handler.runge_kutta_algorithm_4_lorenz([1.0, 1.0, 1.0], 0, 50, n)
+        yield f'rk4_roessler_N{num_steps}', \
+            lambda n=num_steps: eq_handler.runge_kutta_algorithm_4_roessler([1.0, 1.0, 1.0], 0, 400, n)
+    yield f'rk4_lorenz_N{LONG_RUN_STEPS}_k{LONG_RUN_STRIDE}_float32', \
+        lambda: eq_handler.runge_kutta_algorithm_4_lorenz([1.0, 1.0, 1.0], 0, 50, LONG_RUN_STEPS, LONG_RUN_STRIDE,
+                                                          np.float32)
+
+
+def gui_cases():
+    # Qt renders through its offscreen platform plugin, so this runs on a box without a display
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtCore import QEvent, Qt
+    from PyQt5.QtGui import QKeyEvent
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    import main
+    from terminal_handler import MAX_HISTORY
+
+    for count in PLOT_SAMPLES:
+        t_values = np.linspace(0, 50, count)
+        xyz = np.cumsum(np.random.default_rng(0).standard_normal((count, 3)), axis=0)
+        canvas = main.MplCanvas3D2D()
+        canvas.resize(800, 600)
+
+        # Canvases skip arrays they already show, every call gets fresh views so the full path is timed
+        def plot3d(canvas=canvas, xyz=xyz):
+            canvas.plot3D(xyz[:, 0][:], xyz[:, 1][:], xyz[:, 2][:])
+            canvas.draw()
+
+        def plot2d(canvas=canvas, t_values=t_values, xyz=xyz):
+            canvas.plot2D(t_values[:], xyz[:, 0][:], 'Time steps', 'X', 'red')
+            canvas.draw()
+
+        yield f'plot3D_{count}', plot3d
+        yield f'plot2D_{count}', plot2d
+
+    # A command typed into the console after a session of count lines, from the Enter key to the dispatched command
+    frame = main.MainFrame()
+    console = frame.text_edit
+    enter = QKeyEvent(QEvent.KeyPress, Qt.Key_Return, Qt.NoModifier)
+
+    def submit():
+        console.set_current_line('clear infopanel')
+        QApplication.sendEvent(console, enter)
+
+    for count in TERMINAL_LINES:
+        console.setPlainText(f'{main.PROMPT}clear infopanel\n' * count)
+        console.show_prompt()
+        frame.term_handler.history = ['clear infopanel'] * min(count, MAX_HISTORY)
+        yield f'console_submit_{count}_lines', submit
+
+
+def run_benchmarks(repeat=DEFAULT_REPEAT, backend=None, gui=True):
+    results = {}
+    cases = [integrator_cases(backend)]
+    if gui:
+        cases.append(gui_cases())
+    for case in cases:
+        for name, function in case:
+            results[name] = measure(function, repeat)
+            print(f"{name:<36}{results[name]['median'] * 1000:12.3f} ms")
+    return {'metadata': machine_metadata(backend), 'results': results}
+
+
+def machine_metadata(backend=None):
+    import kernel_handler as kh
+    import matplotlib
+
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+        'backend': backend or kh.default_backend(),
+        'available_backends': list(kh.available_backends()),
+        'commit': git_commit(),
+    }
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare_results(current, baseline, threshold=DEFAULT_THRESHOLD):
+    # Medians are compared, a case regresses when it got slower than the baseline by more than threshold
+    regressions = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        ratio = result['median'] / baseline['results'][name]['median']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = 'faster'
+        print(f"{name:<36}{ratio:8.2f}x {flag}")
+    return regressions
+
+
+def read_results(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_results(path, results):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
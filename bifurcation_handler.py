@@ -0,0 +1,60 @@
+import numpy as np
+
+# Swept parameter, its default range and the coordinate whose extrema are recorded (0 = x, 1 = y, 2 = z)
+SWEEPS = {
+    'lorenz': ('rho', 20.0, 200.0, 2),
+    'roessler': ('c', 2.0, 18.0, 2),
+}
+DEFAULT_VALUES = 300
+DEFAULT_DT = {'lorenz': 0.005, 'roessler': 0.02}
+DEFAULT_TRANSIENT = 20000
+DEFAULT_RECORD = 20000
+
+
+def bifurcation_sweep(eq_handler, system, parameter, values, initial_conditions, dt, transient_steps, record_steps,
+                      coordinate=2, extremum='max'):
+    # Every parameter value is one row of a batched RK4 integration. Extrema are picked up on the fly from the
+    # last three samples and refined with a parabola, so nothing but the (param, extremum) points is kept.
+    values = np.asarray(values, dtype=float)
+    constants = dict(eq_handler.constantsl if system == 'lorenz' else eq_handler.constantsr)
+    constants[parameter] = values
+    batch = eq_handler.system_batch(system)
+
+    def rhs(xyz):
+        return batch(xyz, constants)
+
+    state = np.tile(np.asarray(initial_conditions, dtype=float), (len(values), 1))
+    for _ in range(transient_steps):
+        state = eq_handler.runge_kutta_step(rhs, state, dt)
+
+    sign = 1.0 if extremum == 'max' else -1.0
+    params = []
+    extrema = []
+    previous = sign * state[:, coordinate]
+    state = eq_handler.runge_kutta_step(rhs, state, dt)
+    current = sign * state[:, coordinate]
+    for _ in range(record_steps):
+        state = eq_handler.runge_kutta_step(rhs, state, dt)
+        following = sign * state[:, coordinate]
+        peak = (current > previous) & (current >= following)
+        if peak.any():
+            y0 = previous[peak]
+            y1 = current[peak]
+            y2 = following[peak]
+            curvature = y0 - 2 * y1 + y2
+            offset = np.divide(y0 - y2, 2 * curvature, out=np.zeros_like(y1), where=curvature != 0)
+            params.append(values[peak])
+            extrema.append(sign * (y1 - 0.25 * (y0 - y2) * offset))
+        previous = current
+        current = following
+
+    if not params:
+        return np.empty(0), np.empty(0)
+    return np.concatenate(params), np.concatenate(extrema)
+
+
+def default_sweep(eq_handler, system, initial_conditions, num_values=DEFAULT_VALUES):
+    parameter, start, stop, coordinate = SWEEPS[system]
+    values = np.linspace(start, stop, num_values)
+    return bifurcation_sweep(eq_handler, system, parameter, values, initial_conditions, DEFAULT_DT[system],
+                             DEFAULT_TRANSIENT, DEFAULT_RECORD, coordinate)
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 1024 * 1024 * 1024
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.chaos_cache')
+
+
+def trajectory_key(system, constants, initial_conditions, t_start, dt, stride=1, dtype=np.float64):
+    # N and t_end are left out on purpose: runs sharing dt and stride are prefixes of one another
+    return (system, tuple(float(value) for value in constants), tuple(float(value) for value in initial_conditions),
+            float(t_start), float(dt), int(stride), np.dtype(dtype).str)
+
+
+class Trajectory_Cache():
+    # Memory LRU of max_bytes, optionally backed by .npy files in cache_dir. The directory is kept under
+    # max_disk_bytes by deleting the least recently used files, the file mtime is the use time.
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, cache_dir=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def file_path(self, key):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.npy')
+
+    def get(self, key):
+        # Returns the longest cached trajectory for key, which may be shorter than what the caller needs
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                xyz = self.entries[key]
+            else:
+                xyz = None
+        if xyz is not None:
+            if self.cache_dir is not None:
+                self.touch(key)
+            return xyz
+        if self.cache_dir is not None and os.path.exists(self.file_path(key)):
+            try:
+                xyz = np.load(self.file_path(key))
+            except (OSError, ValueError):
+                # evicted by another instance in the meantime, or a damaged file
+                with self.lock:
+                    self.misses += 1
+                return None
+            self.touch(key)
+            self.store(key, xyz)
+            with self.lock:
+                self.hits += 1
+            return xyz
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, xyz):
+        with self.lock:
+            cached = self.entries.get(key)
+        if cached is not None and len(cached) >= len(xyz):
+            return
+        self.store(key, xyz)
+        if self.cache_dir is not None and xyz.nbytes <= self.max_disk_bytes:
+            path = self.file_path(key)
+            temp = path + '.tmp.npy'
+            np.save(temp, xyz)
+            os.replace(temp, path)
+            self.evict_files()
+
+    def touch(self, key):
+        try:
+            os.utime(self.file_path(key))
+        except OSError:
+            pass
+
+    def evict_files(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy') or name.endswith('.tmp.npy'):
+                continue
+            try:
+                status = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            files.append((status.st_mtime, status.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+
+    def store(self, key, xyz):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).nbytes
+            if xyz.nbytes > self.max_bytes:
+                return
+            self.entries[key] = xyz
+            self.size += xyz.nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
@@ -0,0 +1,169 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Only the standard library is imported here, the numerical modules are pulled in by the subcommand that needs
+# them and Qt/matplotlib only by the gui subcommand, so batch runs on a cluster never touch a display stack.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STARTUP_PROBES = [
+    ('headless run', 'import equation_handler, stream_handler'),
+    ('gui modules', 'import main'),
+]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='chaos', description='Chaos simulator')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='integrate a system without the GUI')
+    run.add_argument('system', choices=['lorenz', 'roessler'])
+    run.add_argument('--rho', type=float, default=28.0)
+    run.add_argument('--beta', type=float, default=8 / 3)
+    run.add_argument('--sigma', type=float, default=10.0)
+    run.add_argument('--a', type=float, default=0.1)
+    run.add_argument('--b', type=float, default=0.1)
+    run.add_argument('--c', type=float, default=14.0)
+    run.add_argument('--init', type=float, nargs=3, default=[1.0, 1.0, 1.0], metavar=('X', 'Y', 'Z'))
+    run.add_argument('--t0', type=float, default=0.0)
+    run.add_argument('--tn', type=float, default=50.0)
+    run.add_argument('-N', '--steps', type=int, default=10000)
+    run.add_argument('--out', required=True, help='.npy file the trajectory is streamed into')
+    run.add_argument('--chunk', type=int, default=100000)
+    run.add_argument('--backend', choices=['reference', 'scalar', 'numba'])
+    run.add_argument('--adaptive', action='store_true', help='use RK45, N sets the number of output samples')
+    run.add_argument('--rtol', type=float, default=1e-6)
+    run.add_argument('--atol', type=float, default=1e-9)
+
+    resume = commands.add_parser('resume', help='continue a streamed run from its last written state')
+    resume.add_argument('out')
+    resume.add_argument('--extra', type=int, default=0, help='steps to add beyond the original N')
+    resume.add_argument('--chunk', type=int, default=100000)
+
+    gui = commands.add_parser('gui', help='start the graphical simulator')
+    gui.add_argument('--disk-cache', nargs='?', const='', metavar='DIR',
+                     help='keep integrated runs on disk, in ~/.chaos_cache unless DIR is given')
+    gui.add_argument('--disk-budget', type=float, default=1024, metavar='MB',
+                     help='size the disk cache is kept under, least recently used runs go first')
+    startup = commands.add_parser('startup', help='measure cold-start import times')
+    startup.add_argument('--repeat', type=int, default=3)
+
+    bench = commands.add_parser('bench', help='time the integrators, canvases and command dispatch')
+    bench.add_argument('--out', help='JSON file the results are written to')
+    bench.add_argument('--compare', metavar='BASELINE', help='JSON results to flag regressions against')
+    bench.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown of the median, 0.2 = 20%%')
+    bench.add_argument('--repeat', type=int, default=5)
+    bench.add_argument('--backend', choices=['reference', 'scalar', 'numba'])
+    bench.add_argument('--no-gui', action='store_true', help='skip the canvas and terminal benchmarks')
+    return parser
+
+
+def run_command(args):
+    from equation_handler import Eq_Handler
+    import stream_handler as sh
+
+    eq_handler = Eq_Handler()
+    if args.backend:
+        eq_handler.set_backend(args.backend)
+    if args.system == 'lorenz':
+        eq_handler.set_lorenz_conditions(args.rho, args.beta, args.sigma)
+    else:
+        eq_handler.set_roessler_conditions(args.a, args.b, args.c)
+
+    start = time.perf_counter()
+    if args.adaptive:
+        import numpy as np
+        if args.system == 'lorenz':
+            integrate = eq_handler.dormand_prince_lorenz
+        else:
+            integrate = eq_handler.dormand_prince_roessler
+        _, xyz = integrate(args.init, args.t0, args.tn, args.steps, args.rtol, args.atol)
+        np.save(args.out, xyz)
+        steps, rejected = eq_handler.adaptive_stats
+        print(f"RK45: {steps} steps taken, {rejected} rejected")
+    else:
+        sh.run_stream(sh.stream_to_file(eq_handler, args.system, args.init, args.t0, args.tn, args.steps, args.out,
+                                        args.chunk))
+    report(args.steps, time.perf_counter() - start, args.out)
+
+
+def resume_command(args):
+    import stream_handler as sh
+
+    state = sh.read_state(args.out)
+    remaining = state['num_steps'] + args.extra - state['steps_done']
+    start = time.perf_counter()
+    sh.run_stream(sh.resume_stream(args.out, extra_steps=args.extra, chunk_size=args.chunk))
+    report(remaining, time.perf_counter() - start, args.out)
+
+
+def report(steps, elapsed, out):
+    rate = steps / elapsed if elapsed > 0 else float('inf')
+    print(f"{steps} steps in {elapsed:.3f} s ({rate:.0f} steps/s) -> {out}")
+
+
+def gui_command(args):
+    import main
+    from cache_handler import DEFAULT_CACHE_DIR
+
+    cache_dir = None if args.disk_cache is None else args.disk_cache or DEFAULT_CACHE_DIR
+    return main.start_gui(sys.argv[:1], cache_dir, int(args.disk_budget * 1024 * 1024))
+
+
+def startup_command(args):
+    # Every probe runs in a fresh interpreter so nothing is already cached in sys.modules
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    baseline = measure_import('pass', args.repeat, env)
+    print(f"{'interpreter':<14}{baseline * 1000:9.1f} ms")
+    for name, statement in STARTUP_PROBES:
+        elapsed = measure_import(statement, args.repeat, env)
+        print(f"{name:<14}{elapsed * 1000:9.1f} ms (+{(elapsed - baseline) * 1000:.1f} ms imports)")
+    check = 'import sys, equation_handler, stream_handler; print(any(m in sys.modules for m in ' \
+            '("PyQt5", "matplotlib")))'
+    heavy = subprocess.run([sys.executable, '-c', check], cwd=HERE, env=env, capture_output=True, text=True)
+    print(f"headless path imports Qt/matplotlib: {heavy.stdout.strip()}")
+
+
+def measure_import(statement, repeat, env):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=HERE, env=env, check=True, capture_output=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_command(args):
+    import benchmark_handler as bench
+
+    # Qt must be told to go offscreen before it is imported, the canvases then render without a display
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    # Paths on the command line are relative to where chaos was started, not to the repository
+    out = os.path.abspath(args.out) if args.out else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+    os.chdir(HERE)
+    results = bench.run_benchmarks(args.repeat, args.backend, not args.no_gui)
+    if out:
+        bench.write_results(out, results)
+    if compare:
+        regressions = bench.compare_results(results, bench.read_results(compare), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("No regressions")
+
+
+COMMANDS = {
+    'run': run_command,
+    'resume': resume_command,
+    'gui': gui_command,
+    'startup': startup_command,
+    'bench': bench_command,
+}
+
+
+if __name__ == "__main__":
+    arguments = build_parser().parse_args()
+    sys.exit(COMMANDS[arguments.command](arguments))
@@ -0,0 +1,96 @@
+import numpy as np
+
+DEFAULT_BINS = 512
+CHUNK_ROWS = 1 << 18
+PROJECTIONS = {'xy': (0, 1), 'xz': (0, 2), 'yz': (1, 2)}
+
+# Long runs are aggregated into fixed grids instead of being drawn as lines. Both the bounds and the counts are
+# taken chunk by chunk, so time is linear in the number of samples and memory only depends on the grid size.
+
+
+class Density_Grid():
+    # Sample counts over a bins^d grid between fixed bounds, d = len(low). Samples outside the bounds or not
+    # finite are skipped.
+    def __init__(self, low, high, bins=DEFAULT_BINS):
+        self.low = np.asarray(low, dtype=float)
+        self.high = np.asarray(high, dtype=float)
+        self.bins = bins
+        self.counts = np.zeros((bins,) * len(self.low), dtype=np.int64)
+        self.samples = 0
+
+    def update(self, points):
+        points = np.asarray(points, dtype=float)
+        scaled = (points - self.low) * (self.bins / (self.high - self.low))
+        inside = np.all((scaled >= 0) & (scaled <= self.bins), axis=1)
+        # The upper bound itself belongs to the last cell
+        cells = np.minimum(scaled[inside].astype(np.int64), self.bins - 1)
+        flat = np.ravel_multi_index(tuple(cells.T), self.counts.shape)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+        self.samples += int(np.count_nonzero(inside))
+
+    def log_density(self):
+        # log10 of the fraction of samples per unit cell volume, empty cells are NaN and stay transparent
+        volume = np.prod((self.high - self.low) / self.bins)
+        with np.errstate(divide='ignore'):
+            density = np.log10(self.counts / (max(self.samples, 1) * volume))
+        density[self.counts == 0] = np.nan
+        return density
+
+    def extent(self):
+        return [value for pair in zip(self.low, self.high) for value in pair]
+
+
+def padded_bounds(low, high, margin=0.01):
+    low = np.asarray(low, dtype=float)
+    high = np.asarray(high, dtype=float)
+    pad = np.where(high > low, (high - low) * margin, 0.5)
+    return low - pad, high + pad
+
+
+def column_chunks(columns, chunk_rows=CHUNK_ROWS):
+    # (rows, d) pieces of equally long columns, memory mapped columns are only read chunk by chunk
+    for start in range(0, len(columns[0]), chunk_rows):
+        yield np.column_stack([np.asarray(column[start:start + chunk_rows], dtype=float) for column in columns])
+
+
+def chunk_bounds(chunks):
+    low = None
+    high = None
+    for points in chunks:
+        finite = points[np.isfinite(points).all(axis=1)]
+        if not len(finite):
+            continue
+        low = finite.min(axis=0) if low is None else np.minimum(low, finite.min(axis=0))
+        high = finite.max(axis=0) if high is None else np.maximum(high, finite.max(axis=0))
+    if low is None:
+        raise ValueError("The trajectory contains no finite samples")
+    return padded_bounds(low, high)
+
+
+def array_density(X, Y, Z, projection='xy', bins=DEFAULT_BINS, chunk_rows=CHUNK_ROWS):
+    columns = [(X, Y, Z)[axis] for axis in PROJECTIONS[projection]]
+    grid = Density_Grid(*chunk_bounds(column_chunks(columns, chunk_rows)), bins)
+    for points in column_chunks(columns, chunk_rows):
+        grid.update(points)
+    return grid
+
+
+def integrated_density(eq_handler, system, initial_conditions, t_start, t_end, num_steps, projection='xy',
+                       bins=DEFAULT_BINS, transient_steps=0, chunk_rows=CHUNK_ROWS):
+    # Streams the run twice, once for the bounds and once for the counts, so nothing but the grid and one chunk is
+    # ever held. Integrating twice is cheaper than keeping num_steps samples around once the run gets long.
+    axes = list(PROJECTIONS[projection])
+
+    def chunks():
+        first_row = 0
+        for _, xyz in eq_handler.runge_kutta_chunks(system, initial_conditions, t_start, t_end, num_steps,
+                                                    chunk_rows):
+            skip = min(max(transient_steps - first_row, 0), len(xyz))
+            first_row += len(xyz)
+            if skip < len(xyz):
+                yield xyz[skip:, axes]
+
+    grid = Density_Grid(*chunk_bounds(chunks()), bins)
+    for points in chunks():
+        grid.update(points)
+    return grid
@@ -0,0 +1,203 @@
+import importlib.util
+
+import numpy as np
+
+DEFAULT_RADII = 24
+DEFAULT_REFERENCES = 2000
+DEFAULT_THEILER = 50
+MAX_CANDIDATES = 1 << 22
+PAIR_BUDGET = 20000000
+LEVEL_RATIO = 4.0
+MIN_REFERENCES = 20
+FIT_RANGE = (1e-4, 1e-1)
+MIN_PAIRS = 100
+INDEXES = ('kdtree', 'grid')
+
+# Neighbour counts come from scipy's cKDTree when scipy is installed and otherwise from Grid_Index, a uniform grid
+# with cells as large as the searched radius, so only the 27 surrounding cells are ever compared. The grid compares
+# every candidate pair explicitly, so radii are handled in levels and each level only gets as many reference points
+# as fit in PAIR_BUDGET comparisons. Large radii have many neighbours and need fewer references for the same
+# statistics, which keeps a 10^6 point trajectory at a few seconds per level.
+
+
+def scipy_available():
+    return importlib.util.find_spec('scipy') is not None
+
+
+def default_index():
+    if scipy_available():
+        return 'kdtree'
+    return 'grid'
+
+
+class Grid_Index():
+
+    def __init__(self, points, cell):
+        self.points = points
+        self.cell = cell
+        cells = np.floor(points / cell).astype(np.int64)
+        self.origin = cells.min(axis=0) - 1
+        # one spare cell on every side, so keys of neighbouring cells never wrap into another row
+        self.dims = cells.max(axis=0) - self.origin + 2
+        keys = self.cell_keys(cells)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys, self.starts, counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.ends = self.starts + counts
+
+    def cell_keys(self, cells):
+        cells = cells - self.origin
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def neighbour_ranges(self, rows):
+        # (starts, lengths) into self.order of the points in each of the 27 cells around every row
+        keys = self.cell_keys(np.floor(self.points[rows] / self.cell).astype(np.int64))
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    neighbours = keys + (dx * self.dims[1] + dy) * self.dims[2] + dz
+                    position = np.minimum(np.searchsorted(self.keys, neighbours), len(self.keys) - 1)
+                    found = self.keys[position] == neighbours
+                    yield np.where(found, self.starts[position], 0), \
+                        np.where(found, self.ends[position] - self.starts[position], 0)
+
+    def candidate_counts(self, rows):
+        return sum(lengths for _, lengths in self.neighbour_ranges(rows))
+
+    def candidates(self, rows):
+        # Yields (row, candidate) index pairs covering every point within one cell of the given rows, in batches of
+        # at most MAX_CANDIDATES pairs. Every pair closer than the cell size is among them.
+        for starts, lengths in self.neighbour_ranges(rows):
+            yield from self.expand(rows, starts, lengths)
+
+    def expand(self, rows, starts, lengths):
+        totals = np.cumsum(lengths)
+        first = 0
+        while first < len(rows):
+            offset = totals[first - 1] if first else 0
+            last = max(int(np.searchsorted(totals, offset + MAX_CANDIDATES, side='right')), first + 1)
+            part = lengths[first:last]
+            count = int(part.sum())
+            if count:
+                base = np.repeat(starts[first:last] - (np.cumsum(part) - part), part)
+                yield np.repeat(rows[first:last], part), self.order[base + np.arange(count)]
+            first = last
+
+
+def trajectory_points(X, Y, Z):
+    points = np.column_stack((np.asarray(X, dtype=float), np.asarray(Y, dtype=float), np.asarray(Z, dtype=float)))
+    if not np.isfinite(points).all():
+        raise ValueError("The trajectory contains non-finite values")
+    return points
+
+
+def default_radii(points, count=DEFAULT_RADII):
+    extent = float(np.max(points.max(axis=0) - points.min(axis=0)))
+    if extent <= 0:
+        extent = 1.0
+    return np.logspace(np.log10(extent * 1e-3), np.log10(extent * 0.1), count)
+
+
+def reference_rows(num_points, count=DEFAULT_REFERENCES, seed=0):
+    # Random order, so any leading part of the result is a random subset as well
+    rng = np.random.default_rng(seed)
+    if count is None or count >= num_points:
+        return rng.permutation(num_points)
+    return rng.choice(num_points, count, replace=False)
+
+
+def histogram_counts(distances, radii):
+    # Number of distances <= each radius
+    bins = np.searchsorted(radii, distances, side='left')
+    return np.cumsum(np.bincount(bins, minlength=len(radii) + 1)[:len(radii)])
+
+
+def reference_levels(points, rows, radii, index):
+    # (rows, radius slice, grid) per level. The tree counts all radii in one pass with every reference row.
+    if index == 'kdtree':
+        from scipy.spatial import cKDTree
+        yield rows, slice(0, len(radii)), cKDTree(points)
+        return
+    start = 0
+    while start < len(radii):
+        stop = start + 1
+        while stop < len(radii) and radii[stop] <= radii[start] * LEVEL_RATIO:
+            stop += 1
+        grid = Grid_Index(points, radii[stop - 1])
+        keep = int(np.searchsorted(np.cumsum(grid.candidate_counts(rows)), PAIR_BUDGET, side='right'))
+        yield rows[:max(keep, min(MIN_REFERENCES, len(rows)))], slice(start, stop), grid
+        start = stop
+
+
+def pair_counts(points, rows, radii, index):
+    # Ordered (row, j) pairs over all points j with |x_row - x_j| <= r, self pairs included. index is the cKDTree
+    # over points or a Grid_Index with cells of at least radii[-1].
+    if isinstance(index, Grid_Index):
+        counts = np.zeros(len(radii), dtype=np.int64)
+        for pair_rows, pair_columns in index.candidates(rows):
+            distances = np.linalg.norm(points[pair_rows] - points[pair_columns], axis=1)
+            counts += histogram_counts(distances, radii)
+        return counts
+    from scipy.spatial import cKDTree
+    return cKDTree(points[rows]).count_neighbors(index, radii).astype(np.int64)
+
+
+def correlation_sum(points, radii, theiler=DEFAULT_THEILER, references=DEFAULT_REFERENCES, index=None):
+    # Grassberger-Procaccia C(r) from reference rows against the whole trajectory. Pairs closer than theiler samples
+    # in time are only neighbours because the flow is continuous, they are counted directly and taken out again.
+    # Returns C(r) and the number of pairs behind every value.
+    radii = np.asarray(radii, dtype=float)
+    num_points = len(points)
+    sums = np.zeros(len(radii))
+    counts = np.zeros(len(radii), dtype=np.int64)
+    for rows, level, level_index in reference_levels(points, reference_rows(num_points, references), radii,
+                                                     index or default_index()):
+        counts[level] = pair_counts(points, rows, radii[level], level_index)
+        excluded = 0
+        for lag in range(-theiler, theiler + 1):
+            valid = rows[(rows + lag >= 0) & (rows + lag < num_points)]
+            distances = np.linalg.norm(points[valid] - points[valid + lag], axis=1)
+            counts[level] -= histogram_counts(distances, radii[level])
+            excluded += len(valid)
+        total = len(rows) * num_points - excluded
+        if total > 0:
+            sums[level] = counts[level] / total
+    return sums, counts
+
+
+def correlation_dimension(radii, sums, counts, fit_range=FIT_RANGE, min_pairs=MIN_PAIRS):
+    # D2 is the slope of log C against log r over the scaling region, taken as the radii with C in fit_range that
+    # are backed by at least min_pairs pairs
+    fit = (sums >= fit_range[0]) & (sums <= fit_range[1]) & (counts >= min_pairs)
+    if np.count_nonzero(fit) < 2:
+        return float('nan'), fit
+    slope = np.polyfit(np.log(radii[fit]), np.log(sums[fit]), 1)[0]
+    return float(slope), fit
+
+
+def recurrence_pairs(points, epsilon, index=None):
+    # Sparse recurrence matrix as the (i, j) pairs with i < j and |x_i - x_j| <= epsilon, the matrix is symmetric
+    # with a full diagonal so these pairs describe it completely
+    index = index or default_index()
+    if index == 'kdtree':
+        from scipy.spatial import cKDTree
+        pairs = cKDTree(points).query_pairs(epsilon, output_type='ndarray')
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        return pairs[:, 0], pairs[:, 1]
+    grid = Grid_Index(points, epsilon)
+    found_rows = []
+    found_columns = []
+    for pair_rows, pair_columns in grid.candidates(np.arange(len(points))):
+        keep = pair_columns > pair_rows
+        pair_rows = pair_rows[keep]
+        pair_columns = pair_columns[keep]
+        keep = np.linalg.norm(points[pair_rows] - points[pair_columns], axis=1) <= epsilon
+        found_rows.append(pair_rows[keep])
+        found_columns.append(pair_columns[keep])
+    rows = np.concatenate(found_rows) if found_rows else np.empty(0, dtype=np.int64)
+    columns = np.concatenate(found_columns) if found_columns else np.empty(0, dtype=np.int64)
+    order = np.lexsort((columns, rows))
+    return rows[order], columns[order]
+
+
+def recurrence_rate(num_points, rows):
+    return (2 * len(rows) + num_points) / num_points ** 2 if num_points else 0.0
@@ -1,5 +1,87 @@
+import time
+
 import numpy as np
 
+import kernel_handler as kh
+from adaptive_handler import dormand_prince
+from cache_handler import trajectory_key
+import expression_handler as xh
+import stats_handler as sth
+
+
+def time_slice(t_start, t_end, num_steps, start, stop):
+    # Same values as np.linspace(t_start, t_end, num_steps)[start:stop] without building the whole grid
+    return time_values(t_start, t_end, num_steps, np.arange(start, stop))
+
+
+def time_values(t_start, t_end, num_steps, steps):
+    steps = np.asarray(steps)
+    if num_steps == 1:
+        return np.full(steps.shape, float(t_start))
+    t_values = steps * ((t_end - t_start) / (num_steps - 1)) + t_start
+    return np.where(steps == num_steps - 1, float(t_end), t_values)
+
+
+def output_samples(num_steps, stride):
+    return -(-num_steps // stride)
+
+
+class Time_Grid():
+    # Timestamps of output rows start..stop of a run keeping every stride-th of its num_steps rows, equal to
+    # np.linspace(t_start, t_end, num_steps)[::stride][start:stop]. Values are only computed for the rows asked
+    # for, so plots of long runs index and search the grid without it ever being materialised.
+    def __init__(self, t_start, t_end, num_steps, stride=1, start=0, stop=None):
+        self.t_start = t_start
+        self.t_end = t_end
+        self.num_steps = num_steps
+        self.stride = stride
+        self.start = start
+        self.stop = output_samples(num_steps, stride) if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def values(self, rows):
+        return time_values(self.t_start, self.t_end, self.num_steps, (np.asarray(rows) + self.start) * self.stride)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step == 1:
+                return Time_Grid(self.t_start, self.t_end, self.num_steps, self.stride, self.start + start,
+                                 self.start + max(start, stop))
+            return self.values(np.arange(start, stop, step))
+        if isinstance(item, (int, np.integer)):
+            row = item + len(self) if item < 0 else item
+            if not 0 <= row < len(self):
+                raise IndexError(f"index {item} is out of bounds for a grid of {len(self)} samples")
+            return float(self.values(row))
+        return self.values(item)
+
+    def __array__(self, dtype=None, copy=None):
+        t_values = self.values(np.arange(len(self)))
+        return t_values if dtype is None else t_values.astype(dtype)
+
+    def searchsorted(self, value, side='left'):
+        # Estimated from the spacing, then moved until it is exact against the actual values
+        count = len(self)
+        if count == 0:
+            return 0
+        first = self[0]
+        spacing = (self[-1] - first) / (count - 1) if count > 1 else 0.0
+        row = int(np.clip(np.ceil((value - first) / spacing), 0, count)) if spacing > 0 else 0
+        if side == 'left':
+            while row > 0 and self[row - 1] >= value:
+                row -= 1
+            while row < count and self[row] < value:
+                row += 1
+        else:
+            while row > 0 and self[row - 1] > value:
+                row -= 1
+            while row < count and self[row] <= value:
+                row += 1
+        return row
+
 
 class Eq_Handler():
 
@@ -7,6 +89,18 @@ class Eq_Handler():
         super(Eq_Handler, self).__init__()
         self.constantsl = {}
         self.constantsr = {}
+        self.backend = kh.default_backend()
+        self.last_solution = None
+        self.adaptive_stats = [0, 0]
+        self.cache = None
+        self.stats = None
+        self.user_system = None
+        self.constantsu = {}
+
+    def set_backend(self, backend):
+        if backend not in kh.available_backends():
+            raise ValueError(f"Backend '{backend}' is not available, choose one of {kh.available_backends()}")
+        self.backend = backend
 
     def set_lorenz_conditions(self, rho, beta, sigma):
         self.constantsl['rho'] = rho
@@ -21,19 +115,44 @@ class Eq_Handler():
         dzdt = x * y - self.constantsl['beta'] * z
         return np.array([dxdt, dydt, dzdt])
 
-    def runge_kutta_algorithm_4_lorenz(self, initial_conditions, t_start, t_end, num_steps):
-        t_values = np.linspace(t_start, t_end, num_steps)
-        dt = (t_end - t_start) / num_steps
-        xyz = np.zeros((num_steps, 3))
-        xyz[0] = initial_conditions
+    def lorenz_batch(self, xyz, constants=None):
+        if constants is None:
+            constants = self.constantsl
+        x = xyz[:, 0]
+        y = xyz[:, 1]
+        z = xyz[:, 2]
+        dxyz = np.empty_like(xyz)
+        dxyz[:, 0] = constants['sigma'] * (y - x)
+        dxyz[:, 1] = x * (constants['rho'] - z) - y
+        dxyz[:, 2] = x * y - constants['beta'] * z
+        return dxyz
 
-        for i in range(1, num_steps):
-            k1 = self.lorenz(xyz[i - 1])
-            k2 = self.lorenz(xyz[i - 1] + 0.5 * dt * k1)
-            k3 = self.lorenz(xyz[i - 1] + 0.5 * dt * k2)
-            k4 = self.lorenz(xyz[i - 1] + dt * k3)
-            xyz[i] = xyz[i - 1] + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+    def lorenz_tangent_batch(self, xyz, vectors, constants=None):
+        # Jacobian of the Lorenz field at every row of xyz applied to the (M, 3, K) tangent vectors
+        if constants is None:
+            constants = self.constantsl
+        x = xyz[:, 0, None]
+        y = xyz[:, 1, None]
+        z = xyz[:, 2, None]
+        sigma = np.reshape(constants['sigma'], (-1, 1))
+        rho = np.reshape(constants['rho'], (-1, 1))
+        beta = np.reshape(constants['beta'], (-1, 1))
+        u = vectors[:, 0]
+        v = vectors[:, 1]
+        w = vectors[:, 2]
+        dvectors = np.empty_like(vectors)
+        dvectors[:, 0] = sigma * (v - u)
+        dvectors[:, 1] = (rho - z) * u - v - x * w
+        dvectors[:, 2] = y * u + x * v - beta * w
+        return dvectors
 
+    def runge_kutta_algorithm_4_lorenz(self, initial_conditions, t_start, t_end, num_steps, stride=1, dtype=np.float64):
+        # num_steps RK4 rows of which every stride-th is kept, timestamps come back as an implicit Time_Grid
+        t_values = Time_Grid(t_start, t_end, num_steps, stride)
+        dt = (t_end - t_start) / num_steps
+        xyz = np.zeros((len(t_values), 3), dtype=dtype)
+        xyz[0] = initial_conditions
+        self.runge_kutta_fill('lorenz', xyz, dt, stride, np.array(initial_conditions, dtype=float))
         return t_values, xyz
 
     def set_roessler_conditions(self, a, b, c):
@@ -49,27 +168,256 @@ class Eq_Handler():
         dzdt = self.constantsr['b'] + z * (x - self.constantsr['c'])
         return np.array([dxdt, dydt, dzdt])
 
-    def runge_kutta_algorithm_4_roessler(self, init_conditions, t_start, t_end, num_steps):
-        t_values = np.linspace(t_start, t_end, num_steps)
+    def roessler_batch(self, xyz, constants=None):
+        if constants is None:
+            constants = self.constantsr
+        x = xyz[:, 0]
+        y = xyz[:, 1]
+        z = xyz[:, 2]
+        dxyz = np.empty_like(xyz)
+        dxyz[:, 0] = -y - z
+        dxyz[:, 1] = x + constants['a'] * y
+        dxyz[:, 2] = constants['b'] + z * (x - constants['c'])
+        return dxyz
+
+    def roessler_tangent_batch(self, xyz, vectors, constants=None):
+        if constants is None:
+            constants = self.constantsr
+        x = xyz[:, 0, None]
+        z = xyz[:, 2, None]
+        a = np.reshape(constants['a'], (-1, 1))
+        c = np.reshape(constants['c'], (-1, 1))
+        u = vectors[:, 0]
+        v = vectors[:, 1]
+        w = vectors[:, 2]
+        dvectors = np.empty_like(vectors)
+        dvectors[:, 0] = -v - w
+        dvectors[:, 1] = u + a * v
+        dvectors[:, 2] = z * u + (x - c) * w
+        return dvectors
+
+    def runge_kutta_algorithm_4_roessler(self, init_conditions, t_start, t_end, num_steps, stride=1, dtype=np.float64):
+        # num_steps RK4 rows of which every stride-th is kept, timestamps come back as an implicit Time_Grid
+        t_values = Time_Grid(t_start, t_end, num_steps, stride)
         dt = (t_end - t_start) / num_steps
-        xyz = np.zeros((num_steps, 3))
+        xyz = np.zeros((len(t_values), 3), dtype=dtype)
         xyz[0] = init_conditions
+        self.runge_kutta_fill('roessler', xyz, dt, stride, np.array(init_conditions, dtype=float))
+        return t_values, xyz
+
+    def set_user_equation(self, source):
+        self.user_system = xh.compile_system(source)
+        self.constantsu = dict(self.user_system.constants)
+
+    def user(self, xyz):
+        return self.user_system.kernel(np.asarray(xyz, dtype=float), self.constantsu)
+
+    def user_batch(self, xyz, constants=None):
+        if constants is None:
+            constants = self.constantsu
+        return self.user_system.kernel(xyz, constants)
+
+    def system_rhs(self, system):
+        if system == 'lorenz':
+            return self.lorenz
+        if system == 'user':
+            return self.user
+        return self.roessler
+
+    def system_key(self, system):
+        if system == 'user':
+            return 'user:' + self.user_system.digest
+        return system
+
+    def system_constants(self, system):
+        if system == 'user':
+            return tuple(float(self.constantsu[name]) for name in sorted(self.constantsu))
+        if system == 'lorenz':
+            return float(self.constantsl['rho']), float(self.constantsl['beta']), float(self.constantsl['sigma'])
+        return float(self.constantsr['a']), float(self.constantsr['b']), float(self.constantsr['c'])
+
+    def snapshot(self):
+        handler = Eq_Handler()
+        handler.constantsl = dict(self.constantsl)
+        handler.constantsr = dict(self.constantsr)
+        handler.backend = self.backend
+        handler.cache = self.cache
+        handler.stats = self.stats
+        handler.user_system = self.user_system
+        handler.constantsu = dict(self.constantsu)
+        return handler
+
+    def runge_kutta_fill(self, system, xyz, dt, stride=1, state=None):
+        # Starting from state (xyz[0] when not given), every stride-th RK4 step of size dt overwrites the next row.
+        # The float64 state array is left on the last step, chunked runs continue from it and not from a row
+        # that may have been rounded to float32.
+        if state is None:
+            state = np.array(xyz[0], dtype=float)
+        with sth.timed(self.stats, f'rk4 {system}', (len(xyz) - 1) * stride, xyz.nbytes):
+            if self.backend != 'reference' and system in kh.KERNELS:
+                kernel = kh.get_kernel(system, self.backend)
+                kernel(xyz, state, dt, stride, *self.system_constants(system))
+                return state
+
+            rhs = self.system_rhs(system)
+            current = state.copy()
+            for i in range(1, len(xyz)):
+                for _ in range(stride):
+                    current = self.runge_kutta_step(rhs, current, dt)
+                xyz[i] = current
+            state[:] = current
+            return state
+
+    def runge_kutta_chunks(self, system, initial_conditions, t_start, t_end, num_steps, chunk_size=20000,
+                           first_step=0, dt=None, stride=1, dtype=np.float64):
+        # Yields (t, xyz) pieces that concatenate to exactly the runge_kutta_algorithm_4_* result. chunk_size and
+        # first_step count output rows. With first_step > 0 the run is resumed and initial_conditions is the
+        # state at output row first_step - 1.
+        if dt is None:
+            dt = (t_end - t_start) / num_steps
+        total = output_samples(num_steps, stride)
+        state = np.array(initial_conditions, dtype=float)
+        buffer = np.zeros((chunk_size + 1, 3), dtype=dtype)
+        buffer[0] = state
+        done = first_step
+        while done < total:
+            # the first chunk starts on the initial state itself, later ones continue from the last row
+            first = 1 if done else 0
+            count = min(chunk_size, total - done)
+            self.runge_kutta_fill(system, buffer[:count + first], dt, stride, state)
+            yield Time_Grid(t_start, t_end, num_steps, stride, done, done + count), buffer[first:count + first].copy()
+            buffer[0] = buffer[count + first - 1]
+            done += count
+
+    def cached_chunks(self, system, initial_conditions, t_start, t_end, num_steps, chunk_size=20000, stride=1,
+                      dtype=np.float64):
+        # runge_kutta_chunks behind self.cache: a cached prefix with the same dt and stride is served as is and only
+        # the missing tail is integrated. Whatever got integrated is stored, even if the consumer stops early.
+        if self.cache is None:
+            yield from self.runge_kutta_chunks(system, initial_conditions, t_start, t_end, num_steps, chunk_size,
+                                               stride=stride, dtype=dtype)
+            return
+        dt = (t_end - t_start) / num_steps
+        total = output_samples(num_steps, stride)
+        key = trajectory_key(self.system_key(system), self.system_constants(system), initial_conditions, t_start, dt,
+                             stride, dtype)
+        prefix = self.cache.get(key)
+        if prefix is not None and len(prefix) >= total:
+            yield Time_Grid(t_start, t_end, num_steps, stride, 0, total), prefix[:total]
+            return
+        if np.dtype(dtype) != np.float64:
+            # The last stored float32 row is a rounded state, a chaotic run continued from it would drift away
+            # from what an uncached run returns, so short float32 prefixes are integrated again from the start
+            prefix = None
+
+        pieces = []
+        if prefix is None:
+            chunks = self.runge_kutta_chunks(system, initial_conditions, t_start, t_end, num_steps, chunk_size,
+                                             stride=stride, dtype=dtype)
+        else:
+            pieces.append(prefix)
+            yield Time_Grid(t_start, t_end, num_steps, stride, 0, len(prefix)), prefix
+            chunks = self.runge_kutta_chunks(system, prefix[-1], t_start, t_end, num_steps, chunk_size,
+                                             len(prefix), dt, stride, dtype)
+        try:
+            for t_chunk, xyz_chunk in chunks:
+                pieces.append(xyz_chunk)
+                yield t_chunk, xyz_chunk
+        finally:
+            if pieces:
+                self.cache.put(key, np.concatenate(pieces))
+
+    def cached_runge_kutta(self, system, initial_conditions, t_start, t_end, num_steps, stride=1, dtype=np.float64):
+        pieces = list(self.cached_chunks(system, initial_conditions, t_start, t_end, num_steps, stride=stride,
+                                         dtype=dtype))
+        return Time_Grid(t_start, t_end, num_steps, stride), np.concatenate([piece[1] for piece in pieces])
+
+    def dormand_prince_chunks(self, system, initial_conditions, t_start, t_end, num_steps, chunk_size=20000,
+                              rtol=1e-6, atol=1e-9):
+        # Integrates window by window between output samples, step statistics are summed in adaptive_stats
+        rhs = self.system_rhs(system)
+        self.adaptive_stats = [0, 0]
+        state = np.array(initial_conditions, dtype=float)
+        yield time_slice(t_start, t_end, num_steps, 0, 1), state[None, :].copy()
+        done = 1
+        while done < num_steps:
+            count = min(chunk_size, num_steps - done)
+            t_values = time_slice(t_start, t_end, num_steps, done - 1, done + count)
+            start = time.perf_counter()
+            self.last_solution = dormand_prince(rhs, state, t_values[0], t_values[-1], rtol, atol)
+            self.adaptive_stats[0] += self.last_solution.steps
+            self.adaptive_stats[1] += self.last_solution.rejected
+            xyz = self.last_solution(t_values[1:])
+            if self.stats is not None:
+                self.stats.record(f'rk45 {system}', time.perf_counter() - start, self.last_solution.steps, xyz.nbytes)
+            yield t_values[1:], xyz
+            state = xyz[-1]
+            done += count
+
+    def runge_kutta_step(self, rhs, state, dt):
+        k1 = rhs(state)
+        k2 = rhs(state + 0.5 * dt * k1)
+        k3 = rhs(state + 0.5 * dt * k2)
+        k4 = rhs(state + dt * k3)
+        return state + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+
+    def system_batch(self, system):
+        if system == 'lorenz':
+            return self.lorenz_batch
+        if system == 'user':
+            return self.user_batch
+        return self.roessler_batch
+
+    def system_tangent_batch(self, system):
+        if system == 'lorenz':
+            return self.lorenz_tangent_batch
+        return self.roessler_tangent_batch
+
+    def runge_kutta_algorithm_4_ensemble(self, rhs, init_conditions, t_start, t_end, num_steps, stride=1):
+        # init_conditions is an (M, 3) array, every row is advanced by the same batched RK4 stage
+        state = np.array(init_conditions, dtype=float, ndmin=2)
+        t_values = np.linspace(t_start, t_end, num_steps)[::stride]
+        dt = (t_end - t_start) / num_steps
+        xyz = np.zeros((state.shape[0], len(t_values), 3))
+        xyz[:, 0] = state
 
         for i in range(1, num_steps):
-            k1 = self.roessler(xyz[i - 1])
-            k2 = self.roessler(xyz[i - 1] + 0.5 * dt * k1)
-            k3 = self.roessler(xyz[i - 1] + 0.5 * dt * k2)
-            k4 = self.roessler(xyz[i - 1] + dt * k3)
-            xyz[i] = xyz[i - 1] + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+            state = self.runge_kutta_step(rhs, state, dt)
+            if i % stride == 0:
+                xyz[:, i // stride] = state
 
         return t_values, xyz
 
+    def runge_kutta_algorithm_4_lorenz_ensemble(self, init_conditions, t_start, t_end, num_steps, stride=1):
+        return self.runge_kutta_algorithm_4_ensemble(self.lorenz_batch, init_conditions, t_start, t_end, num_steps,
+                                                     stride)
+
+    def runge_kutta_algorithm_4_roessler_ensemble(self, init_conditions, t_start, t_end, num_steps, stride=1):
+        return self.runge_kutta_algorithm_4_ensemble(self.roessler_batch, init_conditions, t_start, t_end, num_steps,
+                                                     stride)
+
+    def dormand_prince_lorenz(self, initial_conditions, t_start, t_end, num_steps, rtol=1e-6, atol=1e-9):
+        self.last_solution = dormand_prince(self.lorenz, initial_conditions, t_start, t_end, rtol, atol)
+        self.adaptive_stats = [self.last_solution.steps, self.last_solution.rejected]
+        return self.last_solution.sample(t_start, t_end, num_steps)
+
+    def dormand_prince_roessler(self, init_conditions, t_start, t_end, num_steps, rtol=1e-6, atol=1e-9):
+        self.last_solution = dormand_prince(self.roessler, init_conditions, t_start, t_end, rtol, atol)
+        self.adaptive_stats = [self.last_solution.steps, self.last_solution.rejected]
+        return self.last_solution.sample(t_start, t_end, num_steps)
+
     def print_lorenz_eq(self, rho, beta, sigma):
         return f"Lorenz system:\n" \
                f"dxdt = {sigma}(x-y)\n" \
                f"dydt = x({rho}-z)-y\n" \
                f"dzdt = xy-{beta}z\n"
 
+    def print_user_eq(self):
+        equations = "\n".join(f"{name}dt = {expression}" for name, expression in
+                              zip(xh.DERIVATIVES, self.user_system.expressions))
+        parameters = ", ".join(f"{name} = {value}" for name, value in self.constantsu.items())
+        return f"User system:\n{equations}\n{parameters}\n"
+
     def print_roessler_eq(self, a, b, c):
         return f"Rössler system:\n" \
                f"dxdt = -x - y\n" \
@@ -0,0 +1,180 @@
+import ast
+import copy
+import hashlib
+import keyword
+
+import numpy as np
+
+VARIABLES = ('x', 'y', 'z')
+DERIVATIVES = ('dx', 'dy', 'dz')
+FUNCTIONS = {
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'arctan': np.arctan,
+    'sinh': np.sinh,
+    'cosh': np.cosh,
+    'tanh': np.tanh,
+    'exp': np.exp,
+    'log': np.log,
+    'sqrt': np.sqrt,
+    'abs': np.abs,
+}
+RESERVED = ('xyz', 'constants', 'out', 'kernel')
+BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod)
+UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+_compiled = {}
+
+
+class User_System():
+
+    def __init__(self, source, expressions, constants, kernel, digest):
+        self.source = source
+        self.expressions = expressions
+        self.constants = constants
+        self.kernel = kernel
+        self.digest = digest
+
+
+def parse_system(source):
+    # "dx = sigma*(y - x); dy = x*(rho - z) - y; dz = x*y - beta*z; sigma = 10; rho = 28; beta = 2.667"
+    expressions = {}
+    constants = {}
+    for statement in source.replace('\n', ';').split(';'):
+        if not statement.strip():
+            continue
+        if '=' not in statement:
+            raise ValueError(f"Expected 'name = expression', got '{statement.strip()}'")
+        name, text = (part.strip() for part in statement.split('=', 1))
+        if name in expressions or name in constants:
+            raise ValueError(f"'{name}' is defined twice")
+        tree = parse_expression(text)
+        if name in DERIVATIVES:
+            expressions[name] = tree
+        elif name.isidentifier() and not keyword.iskeyword(name) and not name.startswith('_') \
+                and name not in VARIABLES + RESERVED and name not in FUNCTIONS:
+            constants[name] = constant_value(tree, name)
+        else:
+            raise ValueError(f"'{name}' cannot be assigned")
+    missing = [name for name in DERIVATIVES if name not in expressions]
+    if missing:
+        raise ValueError(f"Missing equations for {', '.join(missing)}")
+    for name in DERIVATIVES:
+        check_names(expressions[name], constants)
+    return [expressions[name] for name in DERIVATIVES], constants
+
+
+def parse_expression(text):
+    try:
+        tree = ast.parse(text, mode='eval')
+    except SyntaxError as error:
+        raise ValueError(f"Cannot parse '{text}': {error.msg}")
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Expression, ast.Load, ast.Name) + BINARY_OPERATORS + UNARY_OPERATORS):
+            continue
+        if isinstance(node, (ast.BinOp, ast.UnaryOp)):
+            if not isinstance(node.op, BINARY_OPERATORS + UNARY_OPERATORS):
+                raise ValueError(f"Operator '{type(node.op).__name__}' is not allowed")
+            continue
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            continue
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS \
+                and len(node.args) == 1 and not node.keywords:
+            continue
+        raise ValueError(f"'{ast.get_source_segment(text, node) or type(node).__name__}' is not allowed")
+    # Integer literals become floats so something like 9**9**9 cannot turn into an endless big-int power
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant):
+            try:
+                node.value = float(node.value)
+            except OverflowError:
+                raise ValueError(f"A number in '{text}' is too large")
+    return tree
+
+
+class Literal_Names(ast.NodeTransformer):
+    # Replaces every literal by a name bound to an np.float64, so expressions made only of literals and parameters
+    # overflow to inf or nan like the rest of the integration instead of raising
+    def __init__(self, prefix='_literal'):
+        self.prefix = prefix
+        self.literals = {}
+
+    def visit_Constant(self, node):
+        name = f'{self.prefix}{len(self.literals)}'
+        self.literals[name] = np.float64(node.value)
+        return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+
+
+def numpy_literals(tree, prefix='_literal'):
+    transformer = Literal_Names(prefix)
+    tree = transformer.visit(copy.deepcopy(tree))
+    return tree, transformer.literals
+
+
+def call_targets(tree):
+    # parse_expression only lets whitelisted function names be called, these are the Name nodes in that position
+    return {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+
+
+def constant_value(tree, name):
+    calls = call_targets(tree)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and id(node) not in calls:
+            raise ValueError(f"Parameter '{name}' must be a number")
+    tree, literals = numpy_literals(tree)
+    with np.errstate(all='ignore'):
+        value = float(evaluate(tree, literals))
+    if not np.isfinite(value):
+        raise ValueError(f"Parameter '{name}' is not a finite number")
+    return value
+
+
+def check_names(tree, constants):
+    calls = call_targets(tree)
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Name) or id(node) in calls:
+            continue
+        if node.id in FUNCTIONS:
+            raise ValueError(f"'{node.id}' is a function and must be called, e.g. {node.id}(x)")
+        if node.id not in VARIABLES and node.id not in constants:
+            raise ValueError(f"Unknown name '{node.id}'")
+
+
+def evaluate(tree, namespace):
+    code = compile(tree, '<equation>', 'eval')
+    return eval(code, {'__builtins__': {}, **FUNCTIONS}, namespace)
+
+
+def compile_system(source):
+    # The kernel is built once per distinct expression set and cached by its hash. Parameters are read from a
+    # constants dict on each call, so changing their values never recompiles anything.
+    expressions, constants = parse_system(source)
+    normalized = ';'.join(ast.unparse(tree) for tree in expressions) + '|' + ','.join(sorted(constants))
+    digest = hashlib.sha256(normalized.encode()).hexdigest()[:16]
+    if digest not in _compiled:
+        _compiled[digest] = build_kernel(expressions, sorted(constants))
+    return User_System(source, [ast.unparse(tree) for tree in expressions], constants, _compiled[digest], digest)
+
+
+def build_kernel(expressions, parameter_names):
+    # Only whitelisted trees reach this point, the generated function works on a (3,) state or (M, 3) batch.
+    # Parameters and literals are np.float64, so the whole evaluation follows numpy's inf/nan semantics.
+    namespace = {'__builtins__': {}, '_empty': np.empty, '_shape': np.shape, '_float': np.float64, **FUNCTIONS}
+    lines = ['def kernel(xyz, constants):',
+             '    x = xyz[..., 0]',
+             '    y = xyz[..., 1]',
+             '    z = xyz[..., 2]']
+    lines += [f'    {name} = _float(constants[{name!r}])' for name in parameter_names]
+    lines.append('    out = _empty(_shape(xyz))')
+    for i, tree in enumerate(expressions):
+        tree, literals = numpy_literals(tree, f'_literal{i}_')
+        namespace.update(literals)
+        lines.append(f'    out[..., {i}] = {ast.unparse(tree)}')
+    lines.append('    return out')
+    try:
+        exec(compile('\n'.join(lines), '<equation>', 'exec'), namespace)
+    except Exception as error:
+        raise ValueError(f"Cannot compile the equations: {error}")
+    return namespace['kernel']
@@ -0,0 +1,125 @@
+import importlib.util
+
+BACKENDS = ('reference', 'scalar', 'numba')
+
+_compiled = {}
+
+
+# The kernels are written against scalars only, so the same source runs as a plain Python loop or
+# gets compiled by Numba. Every operation mirrors Eq_Handler.lorenz/roessler and the reference RK4
+# update term by term, which keeps the output bit-for-bit identical to the NumPy path.
+# Integration starts from the float64 state, every stride-th step is stored in xyz[1:] (which may be float32)
+# and state is left holding the last step, so a float32 run continues without losing precision.
+def lorenz_rk4_kernel(xyz, state, dt, stride, rho, beta, sigma):
+    h = 0.5 * dt
+    s = dt / 6
+    x = float(state[0])
+    y = float(state[1])
+    z = float(state[2])
+    for i in range(1, xyz.shape[0]):
+        for _ in range(stride):
+            k1x = sigma * (y - x)
+            k1y = x * (rho - z) - y
+            k1z = x * y - beta * z
+            x2 = x + h * k1x
+            y2 = y + h * k1y
+            z2 = z + h * k1z
+            k2x = sigma * (y2 - x2)
+            k2y = x2 * (rho - z2) - y2
+            k2z = x2 * y2 - beta * z2
+            x3 = x + h * k2x
+            y3 = y + h * k2y
+            z3 = z + h * k2z
+            k3x = sigma * (y3 - x3)
+            k3y = x3 * (rho - z3) - y3
+            k3z = x3 * y3 - beta * z3
+            x4 = x + dt * k3x
+            y4 = y + dt * k3y
+            z4 = z + dt * k3z
+            k4x = sigma * (y4 - x4)
+            k4y = x4 * (rho - z4) - y4
+            k4z = x4 * y4 - beta * z4
+            x = x + s * (k1x + 2 * k2x + 2 * k3x + k4x)
+            y = y + s * (k1y + 2 * k2y + 2 * k3y + k4y)
+            z = z + s * (k1z + 2 * k2z + 2 * k3z + k4z)
+        xyz[i, 0] = x
+        xyz[i, 1] = y
+        xyz[i, 2] = z
+    state[0] = x
+    state[1] = y
+    state[2] = z
+
+
+def roessler_rk4_kernel(xyz, state, dt, stride, a, b, c):
+    h = 0.5 * dt
+    s = dt / 6
+    x = float(state[0])
+    y = float(state[1])
+    z = float(state[2])
+    for i in range(1, xyz.shape[0]):
+        for _ in range(stride):
+            k1x = -y - z
+            k1y = x + a * y
+            k1z = b + z * (x - c)
+            x2 = x + h * k1x
+            y2 = y + h * k1y
+            z2 = z + h * k1z
+            k2x = -y2 - z2
+            k2y = x2 + a * y2
+            k2z = b + z2 * (x2 - c)
+            x3 = x + h * k2x
+            y3 = y + h * k2y
+            z3 = z + h * k2z
+            k3x = -y3 - z3
+            k3y = x3 + a * y3
+            k3z = b + z3 * (x3 - c)
+            x4 = x + dt * k3x
+            y4 = y + dt * k3y
+            z4 = z + dt * k3z
+            k4x = -y4 - z4
+            k4y = x4 + a * y4
+            k4z = b + z4 * (x4 - c)
+            x = x + s * (k1x + 2 * k2x + 2 * k3x + k4x)
+            y = y + s * (k1y + 2 * k2y + 2 * k3y + k4y)
+            z = z + s * (k1z + 2 * k2z + 2 * k3z + k4z)
+        xyz[i, 0] = x
+        xyz[i, 1] = y
+        xyz[i, 2] = z
+    state[0] = x
+    state[1] = y
+    state[2] = z
+
+
+KERNELS = {
+    'lorenz': lorenz_rk4_kernel,
+    'roessler': roessler_rk4_kernel,
+}
+
+
+def numba_available():
+    return importlib.util.find_spec('numba') is not None
+
+
+def available_backends():
+    if numba_available():
+        return BACKENDS
+    return tuple(backend for backend in BACKENDS if backend != 'numba')
+
+
+def default_backend():
+    if numba_available():
+        return 'numba'
+    return 'scalar'
+
+
+def get_kernel(system, backend):
+    if backend == 'scalar':
+        return KERNELS[system]
+    if backend == 'numba':
+        if not numba_available():
+            raise ValueError("Numba backend requested but numba is not installed")
+        if system not in _compiled:
+            import numba
+            _compiled[system] = numba.njit(cache=True, nogil=True)(KERNELS[system])
+        return _compiled[system]
+    raise ValueError(f"Unknown kernel backend '{backend}'")
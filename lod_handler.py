@@ -0,0 +1,38 @@
+import numpy as np
+
+MIN_BINS = 400
+POINTS_PER_PIXEL_3D = 4
+
+
+def minmax_indices(columns, num_bins, start=0, stop=None):
+    # Splits rows [start, stop) into num_bins equal bins and keeps, per bin, the rows holding the min and max of
+    # every column. Extremes and the envelope survive decimation, so the picture only changes below one pixel.
+    if stop is None:
+        stop = len(columns[0])
+    count = stop - start
+    if count <= 4 * num_bins:
+        return np.arange(start, stop)
+    bin_size = count // num_bins
+    full = bin_size * num_bins
+    offsets = start + np.arange(num_bins) * bin_size
+    picks = [np.array([start, stop - 1])]
+    for column in columns:
+        block = np.asarray(column[start:start + full]).reshape(num_bins, bin_size)
+        picks.append(offsets + block.argmin(axis=1))
+        picks.append(offsets + block.argmax(axis=1))
+        if start + full < stop:
+            tail = np.asarray(column[start + full:stop])
+            picks.append(np.array([start + full + tail.argmin(), start + full + tail.argmax()]))
+    return np.unique(np.concatenate(picks))
+
+
+def visible_range(xarray, x_low, x_high):
+    # Row range of a sorted x array covering [x_low, x_high] plus one sample on each side. The method is used so
+    # implicit grids answer it without building the array.
+    start = max(int(xarray.searchsorted(x_low, side='left')) - 1, 0)
+    stop = min(int(xarray.searchsorted(x_high, side='right')) + 1, len(xarray))
+    return start, stop
+
+
+def pixel_bins(ax):
+    return max(int(ax.bbox.width), MIN_BINS)
@@ -0,0 +1,76 @@
+import numpy as np
+
+DEFAULT_DT = {'lorenz': 0.01, 'roessler': 0.05}
+DEFAULT_STEPS = 20000
+DEFAULT_TRANSIENT = 2000
+DEFAULT_RENORMALIZE = 10
+GRID_BATCH = 40000
+
+
+def batch_size(constants):
+    return max(np.size(value) for value in constants.values())
+
+
+def lyapunov_spectrum(eq_handler, system, constants, initial_conditions, dt, num_steps=DEFAULT_STEPS,
+                      transient_steps=DEFAULT_TRANSIENT, renormalize=DEFAULT_RENORMALIZE, num_exponents=3):
+    # constants maps parameter names to scalars or (M,) arrays, every parameter point is one row of the batch.
+    # The tangent-linear system is stepped with the same RK4 stages as the trajectory and re-orthonormalised
+    # by QR every `renormalize` steps, the logs of |diag R| accumulate into the exponents (sorted, largest first).
+    batch = eq_handler.system_batch(system)
+    tangent = eq_handler.system_tangent_batch(system)
+    size = batch_size(constants)
+    state = np.tile(np.asarray(initial_conditions, dtype=float), (size, 1))
+    vectors = np.tile(np.eye(3)[:, :num_exponents], (size, 1, 1))
+    sums = np.zeros((size, num_exponents))
+    h = 0.5 * dt
+
+    for i in range(1, transient_steps + num_steps + 1):
+        k1 = batch(state, constants)
+        q1 = tangent(state, vectors, constants)
+        s2 = state + h * k1
+        k2 = batch(s2, constants)
+        q2 = tangent(s2, vectors + h * q1, constants)
+        s3 = state + h * k2
+        k3 = batch(s3, constants)
+        q3 = tangent(s3, vectors + h * q2, constants)
+        s4 = state + dt * k3
+        k4 = batch(s4, constants)
+        q4 = tangent(s4, vectors + dt * q3, constants)
+        state = state + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+        vectors = vectors + (dt / 6) * (q1 + 2 * q2 + 2 * q3 + q4)
+        if i % renormalize == 0:
+            vectors, r = np.linalg.qr(vectors)
+            if i > transient_steps:
+                sums += np.log(np.abs(np.diagonal(r, axis1=1, axis2=2)))
+
+    renormalizations = (transient_steps + num_steps) // renormalize - transient_steps // renormalize
+    measured = renormalizations * renormalize * dt
+    return -np.sort(-sums / measured, axis=1)
+
+
+def lyapunov_grid(eq_handler, system, constants, name1, values1, name2, values2, initial_conditions, dt,
+                  num_steps=DEFAULT_STEPS, transient_steps=DEFAULT_TRANSIENT):
+    # lambda_max over the values2 x values1 plane, tracked with a single tangent vector in batches of GRID_BATCH
+    grid1, grid2 = np.meshgrid(np.asarray(values1, dtype=float), np.asarray(values2, dtype=float))
+    flat1 = grid1.ravel()
+    flat2 = grid2.ravel()
+    result = np.empty(flat1.size)
+    for start in range(0, flat1.size, GRID_BATCH):
+        stop = min(start + GRID_BATCH, flat1.size)
+        point_constants = dict(constants)
+        point_constants[name1] = flat1[start:stop]
+        point_constants[name2] = flat2[start:stop]
+        result[start:stop] = lyapunov_spectrum(eq_handler, system, point_constants, initial_conditions, dt,
+                                               num_steps, transient_steps, num_exponents=1)[:, 0]
+    return result.reshape(grid1.shape)
+
+
+def kaplan_yorke_dimension(exponents):
+    total = np.cumsum(exponents)
+    positive = np.nonzero(total >= 0)[0]
+    if len(positive) == 0:
+        return 0.0
+    j = positive[-1]
+    if j == len(exponents) - 1:
+        return float(len(exponents))
+    return j + 1 + total[j] / abs(exponents[j + 1])
@@ -1,46 +1,418 @@
+import os
 import sys
 import matplotlib
-from matplotlib import pyplot as plt
-from PyQt5.QtGui import QFont
+from PyQt5.QtGui import QFont, QTextCursor
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT as NavigationToolbar
+from matplotlib.colors import BoundaryNorm, ListedColormap
 from matplotlib.figure import Figure
 import numpy as np
 from PyQt5 import QtWidgets, QtGui
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import QMainWindow, QLabel, QVBoxLayout, QHBoxLayout, QFrame, QSplitter, QApplication, \
-    QStyleFactory, QTextEdit, QWidget, QPushButton
+    QStyleFactory, QTextEdit, QWidget, QPushButton, QCheckBox, QFileDialog, QPlainTextEdit
 import terminal_handler as th
 from terminal_handler import Term_handler
-from equation_handler import Eq_Handler
+from equation_handler import Eq_Handler, Time_Grid, output_samples
+from worker_handler import Integration_Runner, Task_Runner
+import bifurcation_handler as bh
+import lyapunov_handler as lh
+import poincare_handler as ph
+import spectrum_handler as sp
+import plane_handler as pl
+import dimension_handler as dh
+import animation_handler as ah
+import density_handler as dn
+import lod_handler as lod
+import session_handler as sh
+import stats_handler as sth
+from cache_handler import Trajectory_Cache, DEFAULT_MAX_DISK_BYTES
 
 matplotlib.use('Qt5Agg')
 
 
 class MplCanvas3D2D(FigureCanvasQTAgg):
+    # Axes and line artists are created once per plot mode and then only get new data, redraws go through
+    # draw_idle so bursts of updates coalesce. Time series lines are animated and blitted while they fit the axes.
     def __init__(self, parents=None, width=20, height=20, dpi=100):
         self.figure = Figure(figsize=(width, height), dpi=dpi)
         super().__init__(self.figure)
+        self.mode = None
+        self.data = None
+        self.series = None
+        self.line = None
+        self.background = None
+        self.deferred = False
+        self.pending = None
+        self.stats = None
+        self.mpl_connect('scroll_event', self.zoom_time_window)
+        self.mpl_connect('button_press_event', self.reset_time_window)
+        self.mpl_connect('draw_event', self.capture_background)
+
+    def draw(self):
+        with sth.timed(self.stats, 'matplotlib draw'):
+            super().draw()
+
+    def paintEvent(self, event):
+        with sth.timed(self.stats, 'qt paint'):
+            super().paintEvent(event)
+
+    def defer(self):
+        self.deferred = True
+
+    def flush(self):
+        # Replays only the last update requested while deferred, so a batch of plots costs one draw
+        self.deferred = False
+        if self.pending is not None:
+            method, args = self.pending
+            self.pending = None
+            method(*args)
+
+    def set_mode(self, mode):
+        if self.mode == mode:
+            return False
+        self.figure.clear()
+        self.mode = mode
+        self.data = None
+        self.series = None
+        self.background = None
+        return True
+
+    def reset_view(self):
+        # Forgets what is shown so the next plot draws again, a rotated 3D view returns to the default angle
+        if self.mode in ('3d', 'trail'):
+            self.line.axes.view_init()
+        self.data = None
 
     def plot3D(self, xarray, yarray, zarray):
-        self.figure.clear()
-        ax = self.figure.add_subplot(111, projection='3d', position=[0.05, 0.05, 0.9, 0.9])
-        ax.plot(xarray, yarray, zarray)
-        ax.set_xlabel('X')
-        ax.set_ylabel('Y')
-        ax.set_zlabel('Z')
-        self.draw()
-
-    def plot2D(self, xarray, yarray, label1, label2, color):
-        self.figure.clear()
-        ax = self.figure.add_subplot(111, position=[0.15, 0.15, 0.8, 0.8])
-        ax.plot(xarray, yarray, color=color)
+        if self.deferred:
+            self.pending = (self.plot3D, (xarray, yarray, zarray))
+            return
+        if self.mode == '3d' and self.data is not None and all(
+                new is old for new, old in zip((xarray, yarray, zarray), self.data)):
+            return
+        if self.set_mode('3d'):
+            ax = self.figure.add_subplot(111, projection='3d', position=[0.05, 0.05, 0.9, 0.9])
+            self.line, = ax.plot([], [], [])
+            ax.set_xlabel('X')
+            ax.set_ylabel('Y')
+            ax.set_zlabel('Z')
+        ax = self.line.axes
+        self.data = (xarray, yarray, zarray)
+        if len(xarray) == 0:
+            return
+        indices = lod.minmax_indices([xarray, yarray, zarray], lod.POINTS_PER_PIXEL_3D * lod.pixel_bins(ax))
+        self.line.set_data_3d(xarray[indices], yarray[indices], zarray[indices])
+        ax.set_xlim3d(*padded_limits(xarray[indices]))
+        ax.set_ylim3d(*padded_limits(yarray[indices]))
+        ax.set_zlim3d(*padded_limits(zarray[indices]))
+        self.draw_idle()
+
+    def plot_trail(self, xarray, yarray, zarray):
+        # Animation frames: the line only gets new data and the limits only ever grow, so while the trail stays
+        # inside them a frame is blitted over the saved background instead of redrawing the figure
+        if self.set_mode('trail'):
+            ax = self.figure.add_subplot(111, projection='3d', position=[0.05, 0.05, 0.9, 0.9])
+            self.line, = ax.plot([], [], [], animated=True)
+            ax.set_xlabel('X')
+            ax.set_ylabel('Y')
+            ax.set_zlabel('Z')
+            self.data = None
+        ax = self.line.axes
+        self.line.set_data_3d(xarray, yarray, zarray)
+        limits = [padded_limits(values) for values in (xarray, yarray, zarray)]
+        if self.data is not None:
+            limits = [(min(low, old[0]), max(high, old[1])) for (low, high), old in zip(limits, self.data)]
+        if limits != self.data:
+            self.data = limits
+            ax.set_xlim3d(*limits[0])
+            ax.set_ylim3d(*limits[1])
+            ax.set_zlim3d(*limits[2])
+            self.draw_idle()
+        else:
+            self.blit_line()
+
+    def scroll2D(self, xarray, yarray, label1, label2, color):
+        # Animation frames: the time window is twice as long as the trail and pages forward by one trail length
+        # when the newest sample reaches its right edge. Between pages and while y fits, frames are only blitted.
+        if self.set_mode('scroll'):
+            ax = self.figure.add_subplot(111, position=[0.15, 0.15, 0.8, 0.8])
+            self.line, = ax.plot([], [], color=color, animated=True)
+            ax.set_xlabel(label1)
+            ax.set_ylabel(label2)
+            self.data = None
+        ax = self.line.axes
+        self.line.set_data(xarray, yarray)
+        if len(xarray) < 2:
+            return
+        x_low, x_high = ax.get_xlim()
+        y_low, y_high = padded_limits(yarray)
+        limits = None if self.data is None else (x_low, x_high, min(y_low, self.data[2]), max(y_high, self.data[3]))
+        if limits is None or xarray[-1] > x_high:
+            span = max(xarray[-1] - xarray[0], xarray[1] - xarray[0])
+            limits = (xarray[-1] - span, xarray[-1] + span) + (limits or (0, 0, y_low, y_high))[2:]
+        if limits != self.data:
+            self.data = limits
+            ax.set_xlim(*limits[:2])
+            ax.set_ylim(*limits[2:])
+            self.draw_idle()
+        else:
+            self.blit_line()
+
+    def blit_line(self):
+        if self.background is None:
+            self.draw_idle()
+            return
+        with sth.timed(self.stats, 'blit'):
+            self.restore_region(self.background)
+            self.line.axes.draw_artist(self.line)
+            self.blit(self.line.axes.bbox)
+
+    def plot2D(self, xarray, yarray, label1, label2, color, x_range=None):
+        if self.deferred:
+            self.pending = (self.plot2D, (xarray, yarray, label1, label2, color, x_range))
+            return
+        if not isinstance(xarray, Time_Grid):
+            xarray = np.asarray(xarray)
+        yarray = np.asarray(yarray)
+        if self.mode == '2d' and self.series is not None and self.series[0] is xarray and self.series[1] is yarray:
+            return
+        if self.set_mode('2d'):
+            ax = self.figure.add_subplot(111, position=[0.15, 0.15, 0.8, 0.8])
+            self.line, = ax.plot([], [], animated=True)
+            ax.callbacks.connect('xlim_changed', self.refine_time_window)
+        ax = self.line.axes
+        self.series = (xarray, yarray)
+        if len(xarray) == 0:
+            return
+        relabelled = ax.get_xlabel() != label1 or ax.get_ylabel() != label2
+        ax.set_xlabel(label1)
+        ax.set_ylabel(label2)
+        self.line.set_color(color)
+
+        x_limits = x_range if x_range is not None else (xarray[0], xarray[-1])
+        if x_limits[0] == x_limits[1]:
+            x_limits = (x_limits[0] - 0.5, x_limits[1] + 0.5)
+        moved = tuple(ax.get_xlim()) != tuple(float(limit) for limit in x_limits)
+        if moved:
+            ax.set_xlim(*x_limits)
+        else:
+            self.refine_time_window(ax)
+        y_low, y_high = ax.get_ylim()
+        y_data = self.line.get_ydata()
+        fits = len(y_data) and np.nanmin(y_data) >= y_low and np.nanmax(y_data) <= y_high
+        if moved or relabelled or not fits or self.background is None:
+            ax.set_ylim(*padded_limits(y_data))
+            self.draw_idle()
+        else:
+            with sth.timed(self.stats, 'blit'):
+                self.restore_region(self.background)
+                ax.draw_artist(self.line)
+                self.blit(ax.bbox)
+
+    def capture_background(self, event):
+        if self.mode not in ('2d', 'scroll', 'trail'):
+            return
+        ax = self.line.axes
+        self.background = self.copy_from_bbox(ax.bbox)
+        ax.draw_artist(self.line)
+
+    def refine_time_window(self, ax):
+        # Re-decimate only the visible samples, zooming in far enough ends up at full resolution
+        xarray, yarray = self.series
+        x_low, x_high = ax.get_xlim()
+        start, stop = lod.visible_range(xarray, x_low, x_high)
+        indices = lod.minmax_indices([yarray], lod.pixel_bins(ax), start, stop)
+        self.line.set_data(xarray[indices], yarray[indices])
+
+    def zoom_time_window(self, event):
+        if self.mode != '2d' or self.series is None or event.inaxes is None or event.xdata is None:
+            return
+        ax = event.inaxes
+        factor = 1 / 1.5 if event.button == 'up' else 1.5
+        x_low, x_high = ax.get_xlim()
+        ax.set_xlim(event.xdata - (event.xdata - x_low) * factor, event.xdata + (x_high - event.xdata) * factor)
+        self.draw_idle()
+
+    def reset_time_window(self, event):
+        if self.mode != '2d' or self.series is None or event.inaxes is None or not event.dblclick:
+            return
+        xarray = self.series[0]
+        event.inaxes.set_xlim(xarray[0], xarray[-1])
+        self.draw_idle()
+
+    def plot_points(self, xarray, yarray, label1, label2, marker=',', linestyle='None'):
+        if self.deferred:
+            self.pending = (self.plot_points, (xarray, yarray, label1, label2, marker, linestyle))
+            return
+        if self.set_mode('points'):
+            ax = self.figure.add_subplot(111, position=[0.1, 0.1, 0.85, 0.85])
+            self.line, = ax.plot([], [], ',', color='black')
+        ax = self.line.axes
+        self.line.set_data(xarray, yarray)
+        self.line.set_marker(marker)
+        self.line.set_linestyle(linestyle)
+        ax.set_xlabel(label1)
+        ax.set_ylabel(label2)
+        ax.relim()
+        ax.autoscale_view()
+        self.draw_idle()
+
+    def plot_image(self, image, extent, label1, label2, colors, names):
+        # image holds class indices into colors, row 0 is drawn at the bottom of the extent
+        if self.deferred:
+            self.pending = (self.plot_image, (image, extent, label1, label2, colors, names))
+            return
+        if self.set_mode('image'):
+            ax = self.figure.add_subplot(111, position=[0.12, 0.12, 0.68, 0.83])
+            cmap = ListedColormap(colors)
+            self.line = ax.imshow(np.zeros((1, 1)), origin='lower', aspect='auto', interpolation='nearest',
+                                  cmap=cmap, norm=BoundaryNorm(np.arange(len(colors) + 1) - 0.5, cmap.N))
+            colorbar = self.figure.colorbar(self.line, ax=ax, ticks=np.arange(len(colors)))
+            colorbar.ax.set_yticklabels(names)
+        ax = self.line.axes
+        self.line.set_data(image)
+        self.line.set_extent(extent)
+        ax.set_xlabel(label1)
+        ax.set_ylabel(label2)
+        self.draw_idle()
+
+    def plot_density(self, image, extent, label1, label2):
+        # image[i, j] is the density at the i-th x and j-th y cell, empty (NaN) cells are left blank
+        if self.deferred:
+            self.pending = (self.plot_density, (image, extent, label1, label2))
+            return
+        if self.set_mode('density'):
+            ax = self.figure.add_subplot(111, position=[0.12, 0.12, 0.68, 0.83])
+            self.line = ax.imshow(np.zeros((1, 1)), origin='lower', aspect='auto', interpolation='nearest',
+                                  cmap='inferno')
+            colorbar = self.figure.colorbar(self.line, ax=ax)
+            colorbar.set_label('log10 density')
+        ax = self.line.axes
+        self.line.set_data(image.T)
+        self.line.set_extent(extent)
+        if np.isfinite(image).any():
+            self.line.set_clim(np.nanmin(image), np.nanmax(image))
         ax.set_xlabel(label1)
         ax.set_ylabel(label2)
-        self.draw()
+        self.draw_idle()
+
+
+PLANE_COLORS = ['tab:blue', 'tab:green', 'tab:red', 'lightgray']
+PROMPT = '> '
+MAX_TERMINAL_BLOCKS = 2000
+
+
+class Console_Edit(QPlainTextEdit):
+    # Line-input terminal driven by key events. Only the text after the last prompt is editable, Enter hands just
+    # that line to the Term_handler, Up/Down walk the history and Tab completes command names. Old lines are dropped
+    # past MAX_TERMINAL_BLOCKS, so neither typing nor dispatch depends on the length of the session.
+    def __init__(self, term_handler, parent=None):
+        super(Console_Edit, self).__init__(parent)
+        self.term_handler = term_handler
+        self.setMaximumBlockCount(MAX_TERMINAL_BLOCKS)
+        self.setUndoRedoEnabled(False)
+        self.show_prompt()
+
+    def show_prompt(self):
+        self.moveCursor(QTextCursor.End)
+        if self.document().lastBlock().text():
+            self.insertPlainText('\n')
+        self.insertPlainText(PROMPT)
+
+    def prompt_position(self):
+        block = self.document().lastBlock()
+        return block.position() + (len(PROMPT) if block.text().startswith(PROMPT) else 0)
+
+    def current_line(self):
+        text = self.document().lastBlock().text()
+        return text[len(PROMPT):] if text.startswith(PROMPT) else text
+
+    def clamp_selection(self):
+        # A selection reaching into the prompt or the scrollback is cut back to the input line
+        cursor = self.textCursor()
+        start = self.prompt_position()
+        if cursor.hasSelection() and cursor.selectionStart() < start:
+            end = max(cursor.selectionEnd(), start)
+            cursor.setPosition(start)
+            cursor.setPosition(end, QTextCursor.KeepAnchor)
+            self.setTextCursor(cursor)
+        return cursor
+
+    def set_current_line(self, text):
+        cursor = self.textCursor()
+        cursor.setPosition(self.prompt_position())
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.insertText(text)
+        self.setTextCursor(cursor)
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        cursor = self.textCursor()
+        if key in (Qt.Key_Return, Qt.Key_Enter):
+            line = self.current_line()
+            self.moveCursor(QTextCursor.End)
+            self.insertPlainText('\n')
+            self.term_handler.submit(line, self)
+            self.show_prompt()
+        elif key in (Qt.Key_Up, Qt.Key_Down):
+            line = self.term_handler.previous_command() if key == Qt.Key_Up else self.term_handler.next_command()
+            if line is not None:
+                self.set_current_line(line)
+        elif key == Qt.Key_Tab:
+            self.complete_line()
+        elif key == Qt.Key_Home:
+            selecting = event.modifiers() & Qt.ShiftModifier
+            cursor.setPosition(self.prompt_position(), QTextCursor.KeepAnchor if selecting else QTextCursor.MoveAnchor)
+            self.setTextCursor(cursor)
+        elif key in (Qt.Key_Backspace, Qt.Key_Delete) or event.matches(QtGui.QKeySequence.Cut):
+            cursor = self.clamp_selection()
+            start = self.prompt_position()
+            if cursor.hasSelection():
+                super(Console_Edit, self).keyPressEvent(event)
+            elif cursor.position() > start or (key == Qt.Key_Delete and cursor.position() == start):
+                super(Console_Edit, self).keyPressEvent(event)
+        elif key == Qt.Key_Left and not cursor.hasSelection() and cursor.position() <= self.prompt_position():
+            return
+        elif event.matches(QtGui.QKeySequence.Copy) or not event.text():
+            super(Console_Edit, self).keyPressEvent(event)
+        else:
+            # Typing into the scrollback is redirected to the input line
+            if min(cursor.position(), cursor.anchor()) < self.prompt_position():
+                self.moveCursor(QTextCursor.End)
+            super(Console_Edit, self).keyPressEvent(event)
+
+    def complete_line(self):
+        line = self.current_line()
+        completed, matches = self.term_handler.complete(line)
+        if len(matches) > 1 and completed == line.lstrip():
+            # Nothing left to add, list the candidates above a fresh prompt
+            self.moveCursor(QTextCursor.End)
+            self.insertPlainText('\n' + '  '.join(matches))
+            self.show_prompt()
+            self.insertPlainText(completed)
+        else:
+            self.set_current_line(completed)
+
+    def insertFromMimeData(self, source):
+        # Pasted text lands on the input line as one line
+        cursor = self.clamp_selection()
+        if cursor.position() < self.prompt_position():
+            self.moveCursor(QTextCursor.End)
+        self.insertPlainText(' '.join(source.text().splitlines()))
+
+
+def padded_limits(values, margin=0.05):
+    low = np.nanmin(values) if len(values) else 0.0
+    high = np.nanmax(values) if len(values) else 1.0
+    if not np.isfinite(low) or not np.isfinite(high):
+        return 0.0, 1.0
+    pad = (high - low) * margin if high > low else 0.5
+    return low - pad, high + pad
 
 
 class MainFrame(QMainWindow):
 
-    def __init__(self):
+    def __init__(self, cache_dir=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
         super(MainFrame, self).__init__()
         self.setWindowIcon(QtGui.QIcon('icon.png'))
         self.text_edit = None
@@ -50,13 +422,37 @@ class MainFrame(QMainWindow):
         self.lorenz_params1 = None
         self.term_handler = Term_handler(self)
         self.eq_handler = Eq_Handler()
+        # Runs are only kept on disk when asked for, e.g. "chaos gui --disk-cache"
+        self.eq_handler.cache = Trajectory_Cache(cache_dir=cache_dir, max_disk_bytes=max_disk_bytes)
+        self.stats = sth.Stats_Store()
+        self.eq_handler.stats = self.stats
         th.Term_handler.load_command_base(self)
         self.equation = 0
         self.tempLor = []
         self.tempRoe = []
+        self.T = []
         self.X = []
         self.Y = []
         self.Z = []
+        self.spectrum_mode = False
+        self.spectrum = None
+        self.integration_handler = None
+        self.integration_adaptive = False
+        self.time_range = None
+        self.run_settings = None
+        self.batch_depth = 0
+        self.runner = Integration_Runner(self)
+        self.runner.progress.connect(self.on_integration_progress)
+        self.runner.finished.connect(self.on_integration_finished)
+        self.runner.failed.connect(self.print_onto_text_edit)
+        self.task_runner = Task_Runner(self)
+        self.task_runner.failed.connect(self.print_onto_text_edit)
+        self.task_runner.progress.connect(self.print_onto_text_edit)
+        self.plane_run = None
+        self.animation = None
+        self.trail = None
+        self.animation_timer = QTimer(self)
+        self.animation_timer.timeout.connect(self.on_animation_frame)
         self.initUI()
 
     def initUI(self):
@@ -64,6 +460,8 @@ class MainFrame(QMainWindow):
         self.scNoise1 = MplCanvas3D2D()
         self.scNoise2 = MplCanvas3D2D()
         self.scNoise3 = MplCanvas3D2D()
+        for canvas in self.canvases():
+            canvas.stats = self.stats
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
 
@@ -81,6 +479,7 @@ class MainFrame(QMainWindow):
 
         load_data = QPushButton("Load from file")
         load_data.setSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Fixed)
+        load_data.pressed.connect(self.choose_session_file)
 
         init_r_button = QPushButton("Rössler plot")
         init_r_button.setSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Fixed)
@@ -117,7 +516,7 @@ class MainFrame(QMainWindow):
 
         steps_layout = QHBoxLayout()
 
-        steps_label = QLabel("t0, tn and N step values:")
+        steps_label = QLabel("t0, tn, N step values and output stride k (keep every k-th step):")
         self.step_start = QtWidgets.QLineEdit(self)
         t0_layout = QHBoxLayout()
         step_start_label = QLabel("t0:")
@@ -127,6 +526,9 @@ class MainFrame(QMainWindow):
         n_layout = QHBoxLayout()
         self.step_count = QtWidgets.QLineEdit(self)
         step_count_label = QLabel('N:')
+        stride_layout = QHBoxLayout()
+        self.step_stride = QtWidgets.QLineEdit(self)
+        step_stride_label = QLabel('k:')
 
         t0_layout.addWidget(step_start_label)
         t0_layout.addWidget(self.step_start)
@@ -137,10 +539,18 @@ class MainFrame(QMainWindow):
         n_layout.addWidget(step_count_label)
         n_layout.addWidget(self.step_count)
 
+        stride_layout.addWidget(step_stride_label)
+        stride_layout.addWidget(self.step_stride)
+
         steps_layout.addLayout(t0_layout)
         steps_layout.addLayout(tn_layout)
         steps_layout.addLayout(n_layout)
+        steps_layout.addLayout(stride_layout)
 
+        self.adaptive_check = QCheckBox("Adaptive step (RK45), N sets output samples")
+        self.adaptive_check.setSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Fixed)
+        self.float32_check = QCheckBox("Store samples as float32")
+        self.float32_check.setSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Fixed)
 
 
         menu_sublayout = QHBoxLayout()
@@ -214,6 +624,8 @@ class MainFrame(QMainWindow):
         left_layout.addLayout(menu_sublayout)
         left_layout.addWidget(steps_label)
         left_layout.addLayout(steps_layout)
+        left_layout.addWidget(self.adaptive_check)
+        left_layout.addWidget(self.float32_check)
         left_layout.addWidget(plot_button)
         left_layout.addWidget(load_data)
         left_layout.addWidget(info_label)
@@ -247,7 +659,7 @@ class MainFrame(QMainWindow):
 
         hbox_splitter.addWidget(splitter)
 
-        self.text_edit = QTextEdit()
+        self.text_edit = Console_Edit(self.term_handler)
         term_label = QLabel("Terminal:", self)
         term_layout = QVBoxLayout()
         term_layout.addWidget(term_label)
@@ -261,22 +673,6 @@ class MainFrame(QMainWindow):
         self.setGeometry(0, 0, 1200, 800)
         self.setWindowTitle('Chaos Simulator')
 
-        self.text_edit.textChanged.connect(self.look_for_enter_key)
-
-        # Just for testing 3D plotting:
-        self.eq_handler.set_lorenz_conditions(28, 8 / 3, 10)
-        self.tempLor = [28, 8 / 3, 10]
-        init_conditions = [1.0, 1.0, 1.0]
-        t_start = 0.0
-        t_end = 40.0
-        num_steps = 10000
-        t_values, xyz = self.eq_handler.runge_kutta_algorithm_4_lorenz(init_conditions, t_start, t_end, num_steps)
-        self.X = xyz[:, 0]
-        self.Y = xyz[:, 1]
-        self.Z = xyz[:, 2]
-        self.info_edit.setText(self.eq_handler.print_lorenz_eq(28, 8 / 3, 10))
-
-        self.sc.plot3D(self.X, self.Y, self.Z)
         self.lorenz_params1.setText('28')
         self.lorenz_params2.setText('2.6666666')
         self.lorenz_params3.setText('10')
@@ -292,11 +688,10 @@ class MainFrame(QMainWindow):
         self.step_start.setText('0')
         self.step_stop.setText('50')
         self.step_count.setText('10000')
+        self.step_stride.setText('1')
 
-
-    def look_for_enter_key(self):
-        if self.text_edit.toPlainText().endswith('\n'):
-            self.term_handler.get_command(self.text_edit, self.text_edit.toPlainText())
+        # Just for testing 3D plotting, runs in the background once the window is up:
+        QTimer.singleShot(0, self.init_lorenz)
 
     def init_lorenz(self):
         self.info_edit.clear()
@@ -335,18 +730,11 @@ class MainFrame(QMainWindow):
                 t_start = 0
                 t_end = 50
                 num_steps = 10000
-            t_values, xyz = self.eq_handler.runge_kutta_algorithm_4_lorenz(init_conditions, t_start, t_end, num_steps)
-            self.X = xyz[:, 0]
-            self.Y = xyz[:, 1]
-            self.Z = xyz[:, 2]
-
             self.info_edit.append(
                 self.eq_handler.print_lorenz_eq(float(self.lorenz_params1.text()), float(self.lorenz_params2.text()),
                                                 float(self.lorenz_params3.text())))
-            self.sc.plot3D(self.X, self.Y, self.Z)
             self.equation = 0
-            t = np.linspace(t_start, t_end, num_steps)
-            self.draw_noise_plots(t, self.X, self.Y, self.Z)
+            self.start_integration('lorenz', init_conditions, t_start, t_end, num_steps)
         else:
             self.info_edit.setText("ERROR: Empty parameter fields!\n")
 
@@ -387,32 +775,623 @@ class MainFrame(QMainWindow):
                 self.step_start.setText('0')
                 self.step_stop.setText('400')
                 self.step_count.setText('10000')
-            t_values, xyz = self.eq_handler.runge_kutta_algorithm_4_roessler(init_conditions, t_start, t_end, num_steps)
-
-            self.X = xyz[:, 0]
-            self.Y = xyz[:, 1]
-            self.Z = xyz[:, 2]
             self.info_edit.append(self.eq_handler.print_roessler_eq(float(self.roessler_params1.text()),
                                                                     float(self.roessler_params2.text()),
                                                                     float(self.roessler_params3.text())))
-            self.sc.plot3D(self.X, self.Y, self.Z)
             self.equation = 1
-            t = np.linspace(t_start, t_end, num_steps)
-            self.draw_noise_plots(t, self.X, self.Y, self.Z)
+            self.start_integration('roessler', init_conditions, t_start, t_end, num_steps)
         else:
             self.info_edit.setText("ERROR: Empty parameter fields!\n")
 
-    # def load_from_file(self):
-    #
-    # def save_to_file(self):
-
-    def draw_noise_plots(self, t_num, X, Y, Z):
-        self.scNoise1.plot2D(t_num, X, 'Time steps', 'X', 'red')
-        self.scNoise2.plot2D(t_num, Y, 'Time steps', 'Y', 'green')
-        self.scNoise3.plot2D(t_num, Z, 'Time steps', 'Z', 'orange')
+    def start_integration(self, system, init_conditions, t_start, t_end, num_steps):
+        # A new request supersedes whatever is still running, the worker integrates on its own handler copy
+        self.stop_animation()
+        self.integration_handler = self.eq_handler.snapshot()
+        self.integration_adaptive = self.adaptive_check.isChecked()
+        # With RK45 N already is the number of output samples, the stride only thins fixed-step runs
+        stride = 1 if self.integration_adaptive else self.current_stride()
+        dtype = np.float32 if self.float32_check.isChecked() else np.float64
+        time_grid = Time_Grid(t_start, t_end, num_steps, stride)
+        self.time_range = (t_start, t_end)
+        self.spectrum = None
+        self.run_settings = {'system': system, 'init_conditions': [float(value) for value in init_conditions],
+                             't_start': t_start, 't_end': t_end, 'num_steps': num_steps, 'stride': stride,
+                             'adaptive': self.integration_adaptive}
+        if self.integration_adaptive:
+            chunks = self.integration_handler.dormand_prince_chunks(system, init_conditions, t_start, t_end, num_steps)
+        else:
+            chunks = self.integration_handler.cached_chunks(system, init_conditions, t_start, t_end, num_steps,
+                                                            stride=stride, dtype=dtype)
+        if self.batch_depth:
+            # Scripts integrate synchronously, their plots are deferred until the batch ends anyway
+            self.runner.cancel()
+            try:
+                xyz = np.concatenate([piece[1] for piece in chunks]).astype(dtype, copy=False)
+            except Exception as error:
+                self.print_onto_text_edit(f"ERROR: {error}")
+                return
+            self.on_integration_progress(time_grid, xyz)
+            self.on_integration_finished()
+            return
+        self.runner.start(chunks, time_grid, dtype)
+
+    def on_integration_progress(self, t_values, xyz):
+        self.T = t_values
+        self.X = xyz[:, 0]
+        self.Y = xyz[:, 1]
+        self.Z = xyz[:, 2]
+        with self.stats.timed('plot3D', nbytes=xyz.nbytes):
+            self.sc.plot3D(self.X, self.Y, self.Z)
+        self.draw_noise_plots(t_values, self.X, self.Y, self.Z, self.time_range)
+
+    def on_integration_finished(self):
+        if self.integration_adaptive:
+            self.print_adaptive_stats()
+
+    def print_adaptive_stats(self):
+        steps, rejected = self.integration_handler.adaptive_stats
+        self.info_edit.append(f"RK45: {steps} steps taken, {rejected} rejected")
+
+    def start_animation(self, args):
+        # "animate fps=30 trail=2000 steps=10" traces the current system live, "animate off" stops it
+        if args.strip() == 'off':
+            if self.stop_animation():
+                self.print_onto_text_edit("Animation stopped")
+            return
+        try:
+            options = th.parse_options(args)
+            unknown = set(options) - {'fps', 'trail', 'steps'}
+            if unknown:
+                raise ValueError(f"Unknown option '{unknown.pop()}', expected fps, trail or steps")
+            fps = int(options.get('fps', ah.DEFAULT_FPS))
+            capacity = int(options.get('trail', ah.DEFAULT_TRAIL))
+            steps_per_frame = int(options.get('steps', ah.DEFAULT_STEPS_PER_FRAME))
+            if not 0 < fps <= ah.MAX_FPS:
+                raise ValueError(f"fps must be between 1 and {ah.MAX_FPS}")
+            if capacity < 2 or steps_per_frame < 1:
+                raise ValueError("trail must be at least 2 and steps at least 1")
+        except ValueError as error:
+            self.print_onto_text_edit(f"ERROR: {error}")
+            return
+        self.stop_animation()
+        self.runner.cancel()
+        # A restart must not keep the limits or the time window of the previous animation
+        for canvas in self.canvases():
+            canvas.set_mode(None)
+        system = self.current_system()
+        init_conditions = self.current_initial_conditions()
+        t_start, t_end, num_steps = self.current_time_grid()
+        dt = (t_end - t_start) / num_steps
+        self.animation = ah.Animation_Stepper(self.eq_handler.snapshot(), system, init_conditions, t_start, dt,
+                                              steps_per_frame)
+        self.trail = ah.Trail_Buffer(capacity)
+        self.trail.append([[t_start] + init_conditions])
+        self.animation_timer.start(int(1000 / fps))
+        self.print_onto_text_edit(f"Animating {system} at {fps} fps, {steps_per_frame} steps per frame, "
+                                  f"trail of {capacity} samples")
+
+    def stop_animation(self):
+        if self.animation is None:
+            return False
+        self.animation_timer.stop()
+        self.animation = None
+        return True
+
+    def on_animation_frame(self):
+        # One timer tick: a few RK4 steps into the ring, then the same artists get the new trail
+        with self.stats.timed('animation frame'):
+            try:
+                self.trail.append(self.animation.advance())
+            except ArithmeticError as error:
+                self.stop_animation()
+                self.print_onto_text_edit(f"ERROR: {error}")
+                return
+            trail = self.trail.ordered()
+            self.sc.plot_trail(trail[:, 1], trail[:, 2], trail[:, 3])
+            self.scNoise1.scroll2D(trail[:, 0], trail[:, 1], 'Time', 'X', 'red')
+            self.scNoise2.scroll2D(trail[:, 0], trail[:, 2], 'Time', 'Y', 'green')
+            self.scNoise3.scroll2D(trail[:, 0], trail[:, 3], 'Time', 'Z', 'orange')
+
+    def closeEvent(self, event):
+        self.stop_animation()
+        self.runner.shutdown()
+        self.task_runner.shutdown()
+        super(MainFrame, self).closeEvent(event)
+
+    def canvases(self):
+        return [self.sc, self.scNoise1, self.scNoise2, self.scNoise3]
+
+    def begin_batch(self):
+        self.batch_depth += 1
+        self.task_runner.blocking = True
+        for canvas in self.canvases():
+            canvas.defer()
+
+    def end_batch(self):
+        self.batch_depth -= 1
+        if self.batch_depth == 0:
+            self.task_runner.blocking = False
+            for canvas in self.canvases():
+                canvas.flush()
+
+    def plot_system(self, system, args):
+        # "plot Lorenz rho=28 sigma=10 N=20000" fills the option fields and replots with them
+        if system == 'lorenz':
+            fields = {'rho': self.lorenz_params1, 'beta': self.lorenz_params2, 'sigma': self.lorenz_params3,
+                      'x0': self.init_l_condition1, 'y0': self.init_l_condition2, 'z0': self.init_l_condition3}
+        else:
+            fields = {'a': self.roessler_params1, 'b': self.roessler_params2, 'c': self.roessler_params3,
+                      'x0': self.init_r_condition1, 'y0': self.init_r_condition2, 'z0': self.init_r_condition3}
+        steps = {'t0': self.step_start, 'tn': self.step_stop, 'N': self.step_count, 'k': self.step_stride}
+        try:
+            options = th.parse_options(args)
+            for key, value in options.items():
+                if key in fields:
+                    float(value)
+                elif key in steps:
+                    int(value)
+                else:
+                    raise ValueError(f"Unknown option '{key}', expected one of {', '.join(list(fields) + list(steps))}")
+        except ValueError as error:
+            self.print_onto_text_edit(f"ERROR: {error}")
+            return
+        for key, value in options.items():
+            fields.get(key, steps.get(key)).setText(value)
+        if system == 'lorenz':
+            self.init_lorenz()
+        else:
+            self.init_roessler()
+
+    def current_system(self):
+        if self.equation == 1:
+            return 'roessler'
+        if self.equation == 2:
+            return 'user'
+        return 'lorenz'
+
+    def current_stride(self):
+        try:
+            return max(int(self.step_stride.text()), 1)
+        except ValueError:
+            self.step_stride.setText('1')
+            return 1
+
+    def current_time_grid(self):
+        try:
+            return int(self.step_start.text()), int(self.step_stop.text()), int(self.step_count.text())
+        except ValueError:
+            return 0, 50, 10000
+
+    def set_user_equation(self, source):
+        if not source:
+            self.print_onto_text_edit("Usage: equation dx = ...; dy = ...; dz = ...; name = value")
+            return
+        try:
+            self.eq_handler.set_user_equation(source)
+        except (ValueError, ArithmeticError) as error:
+            self.print_onto_text_edit(f"ERROR: {error}")
+            return
+        self.info_edit.clear()
+        self.info_edit.append(self.eq_handler.print_user_eq())
+        self.equation = 2
+        t_start, t_end, num_steps = self.current_time_grid()
+        self.start_integration('user', self.current_initial_conditions(), t_start, t_end, num_steps)
+
+    def current_initial_conditions(self):
+        if self.equation == 1:
+            fields = [self.init_r_condition1, self.init_r_condition2, self.init_r_condition3]
+        else:
+            fields = [self.init_l_condition1, self.init_l_condition2, self.init_l_condition3]
+        try:
+            return [float(field.text()) for field in fields]
+        except ValueError:
+            return [1.0, 1.0, 1.0]
+
+    def show_bifurcation(self):
+        system = self.current_system()
+        if system not in bh.SWEEPS:
+            self.print_onto_text_edit("ERROR: Bifurcation diagrams are available for Lorenz and Rössler only")
+            return
+        parameter, start, stop, coordinate = bh.SWEEPS[system]
+        handler = self.eq_handler.snapshot()
+        init_conditions = self.current_initial_conditions()
+        self.print_onto_text_edit(f"Computing bifurcation diagram over {parameter} in [{start}, {stop}]...")
+
+        def show(result):
+            params, extrema = result
+            self.sc.plot_points(params, extrema, parameter, f"local maxima of {'xyz'[coordinate]}")
+            self.print_onto_text_edit(f"Bifurcation diagram: {len(params)} points")
+
+        self.task_runner.start(lambda: bh.default_sweep(handler, system, init_conditions), show)
+
+    def show_lyapunov(self):
+        system = self.current_system()
+        if system == 'user':
+            self.print_onto_text_edit("ERROR: Lyapunov spectra are available for Lorenz and Rössler only")
+            return
+        handler = self.eq_handler.snapshot()
+        constants = dict(handler.constantsl if system == 'lorenz' else handler.constantsr)
+        init_conditions = self.current_initial_conditions()
+        self.print_onto_text_edit("Computing Lyapunov spectrum...")
+
+        def show(result):
+            exponents = result[0]
+            self.print_onto_text_edit("Lyapunov spectrum: " + ", ".join(
+                f"λ{i + 1} = {value:.4f}" for i, value in enumerate(exponents)))
+            self.print_onto_text_edit(f"Sum: {exponents.sum():.4f}, Kaplan-Yorke dimension: "
+                                      f"{lh.kaplan_yorke_dimension(exponents):.4f}")
+            self.print_onto_text_edit("Chaotic" if exponents[0] > 0.01 else "Not chaotic")
+
+        self.task_runner.start(lambda: lh.lyapunov_spectrum(handler, system, constants, init_conditions,
+                                                            lh.DEFAULT_DT[system]), show)
+
+    def show_poincare(self, args):
+        # "poincare plane=z at=27 dir=-1 skip=5000", the defaults come from poincare_handler.SECTIONS
+        system = self.current_system()
+        handler = self.eq_handler.snapshot()
+        axis, offset, direction = ph.SECTIONS[system]
+        constants = {'lorenz': handler.constantsl, 'roessler': handler.constantsr}.get(system, handler.constantsu)
+        try:
+            options = th.parse_options(args)
+            unknown = set(options) - {'plane', 'at', 'dir', 'skip'}
+            if unknown:
+                raise ValueError(f"Unknown option '{unknown.pop()}', expected plane, at, dir or skip")
+            axis = options.get('plane', axis)
+            if axis not in ph.AXES:
+                raise ValueError(f"plane must be x, y or z, got '{axis}'")
+            value = float(options['at']) if 'at' in options else offset(constants)
+            direction = int(options.get('dir', direction))
+            transient_steps = int(options.get('skip', 0))
+        except ValueError as error:
+            self.print_onto_text_edit(f"ERROR: {error}")
+            return
+        normal, value, direction = ph.axis_section(axis, value, direction)
+        label1, label2 = (name for name in ph.AXES if name != axis)
+        init_conditions = self.current_initial_conditions()
+        t_start, t_end, num_steps = self.current_time_grid()
+        self.print_onto_text_edit(f"Computing Poincaré section {axis} = {value:g} over {num_steps} steps...")
+
+        def show(result):
+            times, points = result
+            self.sc.plot_points(points[:, ph.AXES[label1]], points[:, ph.AXES[label2]], label1, label2)
+            self.print_onto_text_edit(f"Poincaré section: {len(times)} crossings")
+
+        self.task_runner.start(lambda: ph.poincare_section(handler, system, init_conditions, t_start, t_end,
+                                                           num_steps, normal, value, direction, transient_steps),
+                               show)
+
+    def plane_running(self):
+        return self.plane_run is not None and self.plane_run == self.task_runner.run_id and \
+            self.task_runner.is_running()
+
+    def show_parameter_plane(self, args):
+        # "plane n=200 steps=5000 file=rho_sigma.plane", with file the map is checkpointed and resumed from there.
+        # "plane cancel" stops a running map, its finished tiles stay in the checkpoint.
+        if args.strip() == 'cancel':
+            if self.plane_running():
+                self.task_runner.cancel()
+                self.print_onto_text_edit("Parameter plane cancelled")
+            else:
+                self.print_onto_text_edit("No parameter plane is being computed")
+            return
+        if self.plane_running():
+            self.print_onto_text_edit("ERROR: A parameter plane is already being computed, 'plane cancel' stops it")
+            return
+        system = self.current_system()
+        if system not in pl.PLANES:
+            self.print_onto_text_edit("ERROR: Parameter planes are available for Lorenz and Rössler only")
+            return
+        try:
+            options = th.parse_options(args)
+            unknown = set(options) - {'n', 'steps', 'procs', 'file'}
+            if unknown:
+                raise ValueError(f"Unknown option '{unknown.pop()}', expected n, steps, procs or file")
+            num_values = int(options.get('n', 100))
+            num_steps = int(options.get('steps', pl.DEFAULT_STEPS))
+            processes = int(options['procs']) if 'procs' in options else None
+            if num_values < 2:
+                raise ValueError("n must be at least 2")
+            if num_steps < 1:
+                raise ValueError("steps must be positive")
+            if processes is not None and processes < 1:
+                raise ValueError("procs must be positive")
+            name1, values1, name2, values2 = pl.default_plane(system, num_values)
+        except ValueError as error:
+            self.print_onto_text_edit(f"ERROR: {error}")
+            return
+        checkpoint = options.get('file')
+        handler = self.eq_handler.snapshot()
+        constants = dict(handler.constantsl if system == 'lorenz' else handler.constantsr)
+        init_conditions = self.current_initial_conditions()
+        self.print_onto_text_edit(f"Computing {num_values}x{num_values} map over ({name1}, {name2})...")
+
+        def show(plane):
+            classes = pl.classify(plane)
+            extent = (values1[0], values1[-1], values2[0], values2[-1])
+            self.sc.plot_image(classes, extent, name1, name2, PLANE_COLORS, pl.CLASS_NAMES)
+            self.print_onto_text_edit("Parameter plane: " + ", ".join(
+                f"{name} {np.count_nonzero(classes == index)}" for index, name in enumerate(pl.CLASS_NAMES)))
+
+        def task(cancel, report):
+            return pl.parameter_plane(system, constants, name1, values1, name2, values2, init_conditions,
+                                      num_steps=num_steps, checkpoint=checkpoint, processes=processes,
+                                      progress=lambda done, total: report(f"Parameter plane: {done}/{total} tiles"),
+                                      cancel=cancel)
+
+        self.task_runner.start(task, show, cancellable=True)
+        self.plane_run = self.task_runner.run_id
+
+    def current_points(self):
+        if not len(self.X):
+            raise ValueError("Nothing integrated yet, run a system first")
+        return dh.trajectory_points(self.X, self.Y, self.Z)
+
+    def show_dimension(self, args):
+        # "dimension refs=2000 theiler=50 index=grid", works on the trajectory that is currently shown
+        try:
+            options = th.parse_options(args)
+            unknown = set(options) - {'refs', 'theiler', 'index'}
+            if unknown:
+                raise ValueError(f"Unknown option '{unknown.pop()}', expected refs, theiler or index")
+            references = int(options.get('refs', dh.DEFAULT_REFERENCES))
+            theiler = int(options.get('theiler', dh.DEFAULT_THEILER))
+            index = options.get('index', dh.default_index())
+            if references < 1:
+                raise ValueError("refs must be positive")
+            if theiler < 0:
+                raise ValueError("theiler must not be negative")
+            if index not in dh.INDEXES:
+                raise ValueError(f"index must be kdtree or grid, got '{index}'")
+            if index == 'kdtree' and not dh.scipy_available():
+                raise ValueError("index=kdtree needs scipy")
+            points = self.current_points()
+        except ValueError as error:
+            self.print_onto_text_edit(f"ERROR: {error}")
+            return
+        self.print_onto_text_edit(f"Computing correlation sum of {len(points)} points ({index})...")
+
+        def compute():
+            radii = dh.default_radii(points)
+            sums, counts = dh.correlation_sum(points, radii, theiler, references, index)
+            return radii, sums, counts
+
+        def show(result):
+            radii, sums, counts = result
+            dimension, fit = dh.correlation_dimension(radii, sums, counts)
+            valid = sums > 0
+            self.sc.plot_points(np.log10(radii[valid]), np.log10(sums[valid]), 'log10 r', 'log10 C(r)', 'o', '-')
+            if np.isnan(dimension):
+                self.print_onto_text_edit("Correlation dimension: no scaling region found, integrate a longer run")
+                return
+            self.print_onto_text_edit(f"Correlation dimension D2 = {dimension:.3f} (fit over {np.count_nonzero(fit)}"
+                                      f" radii, r in [{radii[fit][0]:.3g}, {radii[fit][-1]:.3g}])")
+
+        self.task_runner.start(compute, show)
+
+    def show_recurrence(self, args):
+        # "recurrence eps=0.5 n=5000", the trajectory is thinned to at most n evenly spaced samples first
+        try:
+            options = th.parse_options(args)
+            unknown = set(options) - {'eps', 'n'}
+            if unknown:
+                raise ValueError(f"Unknown option '{unknown.pop()}', expected eps or n")
+            num_points = int(options.get('n', 5000))
+            if num_points < 2:
+                raise ValueError("n must be at least 2")
+            points = self.current_points()
+            points = points[::-(-len(points) // num_points)]
+            epsilon = float(options['eps']) if 'eps' in options else \
+                0.05 * float(np.max(points.max(axis=0) - points.min(axis=0)))
+            if not 0 < epsilon < np.inf:
+                raise ValueError("eps must be a positive number")
+        except ValueError as error:
+            self.print_onto_text_edit(f"ERROR: {error}")
+            return
+        self.print_onto_text_edit(f"Computing recurrence plot of {len(points)} points, eps = {epsilon:.4g}...")
+
+        def show(result):
+            rows, columns = result
+            diagonal = np.arange(len(points))
+            self.sc.plot_points(np.concatenate((rows, columns, diagonal)), np.concatenate((columns, rows, diagonal)),
+                                'i', 'j')
+            self.print_onto_text_edit(f"Recurrence rate: {dh.recurrence_rate(len(points), rows):.4f} "
+                                      f"({len(rows)} pairs)")
+
+        self.task_runner.start(lambda: dh.recurrence_pairs(points, epsilon), show)
+
+    def show_density(self, args):
+        # "density plane=xz bins=512 steps=100000000 skip=10000", without steps the current trajectory is binned,
+        # with steps a new run of that many steps at the current dt is streamed without ever being stored
+        try:
+            options = th.parse_options(args)
+            unknown = set(options) - {'plane', 'bins', 'steps', 'skip'}
+            if unknown:
+                raise ValueError(f"Unknown option '{unknown.pop()}', expected plane, bins, steps or skip")
+            projection = options.get('plane', 'xy')
+            if projection not in dn.PROJECTIONS:
+                raise ValueError(f"plane must be xy, xz or yz, got '{projection}'")
+            bins = int(options.get('bins', dn.DEFAULT_BINS))
+            if bins < 1:
+                raise ValueError("bins must be positive")
+            num_steps = int(options['steps']) if 'steps' in options else None
+            transient_steps = int(options.get('skip', 0))
+            if num_steps is None and not len(self.X):
+                raise ValueError("Nothing integrated yet, run a system first or give steps")
+        except ValueError as error:
+            self.print_onto_text_edit(f"ERROR: {error}")
+            return
+        label1, label2 = (projection[0].upper(), projection[1].upper())
+        if num_steps is None:
+            X, Y, Z = self.X[transient_steps:], self.Y[transient_steps:], self.Z[transient_steps:]
+            self.print_onto_text_edit(f"Binning {len(X)} samples into {bins}x{bins} {label1}{label2} cells...")
+            task = lambda: dn.array_density(X, Y, Z, projection, bins)
+        else:
+            system = self.current_system()
+            handler = self.eq_handler.snapshot()
+            init_conditions = self.current_initial_conditions()
+            t_start, t_end, grid_steps = self.current_time_grid()
+            t_end = t_start + (t_end - t_start) / grid_steps * num_steps
+            self.print_onto_text_edit(f"Streaming {num_steps} steps into {bins}x{bins} {label1}{label2} cells...")
+            task = lambda: dn.integrated_density(handler, system, init_conditions, t_start, t_end, num_steps,
+                                                 projection, bins, transient_steps)
+
+        def show(grid):
+            self.sc.plot_density(grid.log_density(), grid.extent(), label1, label2)
+            self.print_onto_text_edit(f"Density: {grid.samples} samples, "
+                                      f"{np.count_nonzero(grid.counts)} of {grid.counts.size} cells visited")
+
+        self.task_runner.start(task, show)
+
+    def choose_session_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load session", "",
+                                              f"Chaos sessions (*{sh.EXTENSION});;All files (*)")
+        if path:
+            self.load_from_file(path)
+
+    def save_to_file(self, path):
+        if not path:
+            self.print_onto_text_edit(f"Usage: save session <file{sh.EXTENSION}>")
+            return
+        if self.run_settings is None:
+            self.print_onto_text_edit("ERROR: Nothing has been integrated yet")
+            return
+        if not os.path.splitext(path)[1]:
+            path += sh.EXTENSION
+        settings = dict(self.run_settings, equation=self.equation,
+                        tempLor=[float(value) for value in self.tempLor],
+                        tempRoe=[float(value) for value in self.tempRoe],
+                        user_equation=self.eq_handler.user_system.source if self.eq_handler.user_system else None)
+        try:
+            header = sh.save_session(path, settings, self.X, self.Y, self.Z)
+        except OSError as error:
+            self.print_onto_text_edit(f"ERROR: Cannot save session '{path}': {error.strerror}")
+            return
+        self.print_onto_text_edit(f"Session saved to {path} ({header['shape'][0]} samples)")
+
+    def load_from_file(self, path):
+        # The trajectory stays memory mapped, plotting only reads the pages the decimation touches
+        if not path:
+            self.print_onto_text_edit(f"Usage: load file <file{sh.EXTENSION}>")
+            return
+        try:
+            header, xyz = sh.load_session(path)
+            if header['user_equation']:
+                self.eq_handler.set_user_equation(header['user_equation'])
+        except (OSError, ValueError, KeyError) as error:
+            self.print_onto_text_edit(f"ERROR: Cannot load session '{path}': {error}")
+            return
+        self.runner.cancel()
+        self.stop_animation()
+        self.tempLor = np.array(header['tempLor'])
+        self.tempRoe = np.array(header['tempRoe'])
+        if len(self.tempLor):
+            self.eq_handler.set_lorenz_conditions(*header['tempLor'])
+            for field, value in zip([self.lorenz_params1, self.lorenz_params2, self.lorenz_params3], self.tempLor):
+                field.setText(str(value))
+        if len(self.tempRoe):
+            self.eq_handler.set_roessler_conditions(*header['tempRoe'])
+            for field, value in zip([self.roessler_params1, self.roessler_params2, self.roessler_params3],
+                                    self.tempRoe):
+                field.setText(str(value))
+        self.equation = header['equation']
+        if self.equation == 1:
+            fields = [self.init_r_condition1, self.init_r_condition2, self.init_r_condition3]
+        else:
+            fields = [self.init_l_condition1, self.init_l_condition2, self.init_l_condition3]
+        for field, value in zip(fields, header['init_conditions']):
+            field.setText(str(value))
+        t_start, t_end, num_steps = header['t_start'], header['t_end'], header['num_steps']
+        self.step_start.setText(str(t_start))
+        self.step_stop.setText(str(t_end))
+        self.step_count.setText(str(num_steps))
+        stride = header.get('stride', 1)
+        self.step_stride.setText(str(stride))
+        self.adaptive_check.setChecked(header['adaptive'])
+        self.float32_check.setChecked(np.dtype(header['dtype']) == np.float32)
+        self.run_settings = {key: header[key] for key in
+                             ('system', 'init_conditions', 't_start', 't_end', 'num_steps', 'adaptive')}
+        self.run_settings['stride'] = stride
+
+        self.show_equation()
+        self.time_range = (t_start, t_end)
+        self.spectrum = None
+        self.T = Time_Grid(t_start, t_end, num_steps, stride, 0, len(xyz))
+        self.X = xyz[:, 0]
+        self.Y = xyz[:, 1]
+        self.Z = xyz[:, 2]
+        self.sc.plot3D(self.X, self.Y, self.Z)
+        self.draw_noise_plots(self.T, self.X, self.Y, self.Z, self.time_range)
+        self.print_onto_text_edit(f"Session loaded from {path} ({len(xyz)} samples)")
+
+    def draw_noise_plots(self, t_num, X, Y, Z, x_range=None):
+        if self.spectrum_mode:
+            self.draw_spectrum_plots(X, Y, Z)
+            return
+        with self.stats.timed('noise plots'):
+            self.scNoise1.plot2D(t_num, X, 'Time steps', 'X', 'red', x_range)
+            self.scNoise2.plot2D(t_num, Y, 'Time steps', 'Y', 'green', x_range)
+            self.scNoise3.plot2D(t_num, Z, 'Time steps', 'Z', 'orange', x_range)
+
+    def draw_spectrum_plots(self, X, Y, Z):
+        with self.stats.timed('spectrum'):
+            frequencies, psd = self.update_spectrum(X, Y, Z)
+        if not self.spectrum.segments:
+            return
+        log_psd = np.log10(np.maximum(psd, np.finfo(float).tiny))
+        self.scNoise1.plot2D(frequencies, log_psd[0], 'Frequency', 'log10 PSD X', 'red')
+        self.scNoise2.plot2D(frequencies, log_psd[1], 'Frequency', 'log10 PSD Y', 'green')
+        self.scNoise3.plot2D(frequencies, log_psd[2], 'Frequency', 'log10 PSD Z', 'orange')
+
+    def update_spectrum(self, X, Y, Z):
+        # Only rows that arrived since the last call are fed to the estimator, a new run starts a new one
+        if self.spectrum is None or len(X) < self.spectrum.rows:
+            settings = self.run_settings
+            spacing = (settings['t_end'] - settings['t_start']) / max(settings['num_steps'] - 1, 1) * \
+                settings['stride']
+            total = output_samples(settings['num_steps'], settings['stride'])
+            self.spectrum = sp.Welch_Estimator(spacing, segment=sp.segment_length(total))
+        start = self.spectrum.rows
+        self.spectrum.update([X[start:], Y[start:], Z[start:]])
+        return self.spectrum.density()
+
+    def set_spectrum_mode(self, args):
+        args = args.strip()
+        if args not in ('', 'on', 'off'):
+            self.print_onto_text_edit("Usage: spectrum [on|off]")
+            return
+        self.spectrum_mode = not self.spectrum_mode if not args else args == 'on'
+        self.print_onto_text_edit(f"Spectrum mode {'on' if self.spectrum_mode else 'off'}")
+        if len(self.X):
+            self.draw_noise_plots(self.T, self.X, self.Y, self.Z, self.time_range)
+
+    def show_stats(self, args):
+        if args.strip() == 'clear':
+            self.stats.clear()
+            self.print_onto_text_edit("Timings cleared")
+            return
+        self.print_onto_text_edit(self.stats.summary())
+
+    def profile_command(self, line):
+        # The command runs synchronously like a script line and pending redraws are processed inside the capture,
+        # so the dump covers integration and drawing of this one action
+        if not line:
+            self.print_onto_text_edit("Usage: profile <command>")
+            return
+
+        def action():
+            self.begin_batch()
+            try:
+                self.term_handler.execute_line(line)
+            finally:
+                self.end_batch()
+            QApplication.processEvents()
+
+        report = sth.profile_call(action, sth.PROFILE_PATH)
+        self.print_onto_text_edit(f"Profile of '{line}' written to {sth.PROFILE_PATH}")
+        self.print_onto_text_edit(report)
 
     def redraw_figure(self):
-        self.sc.draw()
+        self.sc.reset_view()
         self.sc.plot3D(self.X, self.Y, self.Z)
 
     def print_onto_text_edit(self, text):
@@ -434,10 +1413,17 @@ class MainFrame(QMainWindow):
         elif (self.equation == 1):
             self.info_edit.clear()
             self.info_edit.setText(self.eq_handler.print_roessler_eq(self.tempRoe[0], self.tempRoe[1], self.tempRoe[2]))
+        elif (self.equation == 2):
+            self.info_edit.clear()
+            self.info_edit.setText(self.eq_handler.print_user_eq())
 
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    main_window = MainFrame()
+def start_gui(argv, cache_dir=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+    app = QApplication(argv)
+    main_window = MainFrame(cache_dir, max_disk_bytes)
     main_window.show()
-    sys.exit(app.exec_())
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    sys.exit(start_gui(sys.argv))
@@ -0,0 +1,204 @@
+import json
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import lyapunov_handler as lh
+from equation_handler import Eq_Handler
+
+DEFAULT_TILE = 25
+DEFAULT_STEPS = 5000
+DEFAULT_TRANSIENT = 2000
+THRESHOLD = 0.01
+FIXED_POINT, PERIODIC, CHAOTIC, UNBOUNDED = 0, 1, 2, 3
+CLASS_NAMES = ('fixed point', 'periodic', 'chaotic', 'unbounded')
+STATE_FILE = 'plane.json'
+LAMBDA_FILE = 'lambda.npy'
+DONE_FILE = 'tiles.npy'
+LOCK_FILE = 'plane.lock'
+POLL_INTERVAL = 0.2
+
+
+class Cancelled(Exception):
+    pass
+
+
+# Default planes as (name1, start1, stop1, name2, start2, stop2), name1 runs along x of the rendered image
+PLANES = {
+    'lorenz': ('rho', 1.0, 200.0, 'sigma', 1.0, 30.0),
+    'roessler': ('a', 0.01, 0.4, 'c', 1.0, 18.0),
+}
+
+
+def tile_bounds(shape, tile):
+    # (row, column) slices of every tile, row-major over the (len2, len1) result
+    return [(slice(i, min(i + tile, shape[0])), slice(j, min(j + tile, shape[1])))
+            for i in range(0, shape[0], tile) for j in range(0, shape[1], tile)]
+
+
+def compute_tile(task):
+    # Runs in a pool process: attaches to the shared result, fills its tile in place and only returns the index
+    index, memory_name, shape, settings, rows, columns = task
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        result = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        values1 = np.asarray(settings['values1'])[columns]
+        values2 = np.asarray(settings['values2'])[rows]
+        with np.errstate(all='ignore'):
+            result[rows, columns] = lh.lyapunov_grid(Eq_Handler(), settings['system'], settings['constants'],
+                                                     settings['name1'], values1, settings['name2'], values2,
+                                                     settings['init_conditions'], settings['dt'],
+                                                     settings['num_steps'], settings['transient_steps'])
+        del result
+    finally:
+        memory.close()
+    return index
+
+
+def parameter_plane(system, constants, name1, values1, name2, values2, initial_conditions, dt=None,
+                    num_steps=DEFAULT_STEPS, transient_steps=DEFAULT_TRANSIENT, checkpoint=None, processes=None,
+                    tile=DEFAULT_TILE, progress=None, cancel=None):
+    # lambda_max over the values2 x values1 plane. Tiles are spread over a process pool that writes straight into
+    # shared memory. With a checkpoint directory every finished tile is saved there first, and calling again with
+    # the same settings only computes the tiles that are still missing. progress(done, total) is called per tile.
+    # Setting the cancel event terminates the pool and raises Cancelled, finished tiles stay in the checkpoint.
+    settings = {
+        'system': system,
+        'constants': {name: float(value) for name, value in constants.items() if name not in (name1, name2)},
+        'name1': name1, 'values1': [float(value) for value in values1],
+        'name2': name2, 'values2': [float(value) for value in values2],
+        'init_conditions': [float(value) for value in initial_conditions],
+        'dt': float(lh.DEFAULT_DT[system] if dt is None else dt),
+        'num_steps': int(num_steps), 'transient_steps': int(transient_steps), 'tile': int(tile),
+    }
+    shape = (len(settings['values2']), len(settings['values1']))
+    tiles = tile_bounds(shape, tile)
+    if checkpoint is None:
+        stored = np.full(shape, np.nan)
+        done = np.zeros(len(tiles), dtype=bool)
+        return compute_plane(settings, shape, tiles, stored, done, None, processes, progress, cancel)
+    lock = acquire_checkpoint(checkpoint)
+    try:
+        stored, done = open_checkpoint(checkpoint, settings, shape, len(tiles))
+        return compute_plane(settings, shape, tiles, stored, done, checkpoint, processes, progress, cancel)
+    finally:
+        os.remove(lock)
+
+
+def compute_plane(settings, shape, tiles, stored, done, checkpoint, processes, progress, cancel):
+    memory = shared_memory.SharedMemory(create=True, size=max(stored.nbytes, 1))
+    try:
+        result = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        result[:] = stored
+        pending = [(index, memory.name, shape, settings, rows, columns)
+                   for index, (rows, columns) in enumerate(tiles) if not done[index]]
+        if progress is not None:
+            progress(int(done.sum()), len(tiles))
+        if pending:
+            # spawn keeps the pool independent of whatever threads the calling process (e.g. the GUI) runs
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(processes) as pool:
+                results = pool.imap_unordered(compute_tile, pending)
+                for _ in range(len(pending)):
+                    try:
+                        index = next_tile(results, cancel)
+                    except Cancelled:
+                        pool.terminate()
+                        raise
+                    rows, columns = tiles[index]
+                    if checkpoint is not None:
+                        # The values are flushed before the tile is marked, a kill in between only redoes the tile
+                        stored[rows, columns] = result[rows, columns]
+                        stored.flush()
+                        done[index] = True
+                        done.flush()
+                    else:
+                        done[index] = True
+                    if progress is not None:
+                        progress(int(done.sum()), len(tiles))
+        plane = result.copy()
+        del result
+    finally:
+        memory.close()
+        memory.unlink()
+    return plane
+
+
+def next_tile(results, cancel):
+    # Waits for the next finished tile, looking at the cancel event every POLL_INTERVAL seconds
+    while True:
+        if cancel is not None and cancel.is_set():
+            raise Cancelled("Parameter plane cancelled")
+        try:
+            return results.next(POLL_INTERVAL if cancel is not None else None)
+        except multiprocessing.TimeoutError:
+            continue
+
+
+def acquire_checkpoint(checkpoint):
+    # One run per checkpoint directory. A lock left behind by a killed process is taken over.
+    os.makedirs(checkpoint, exist_ok=True)
+    path = os.path.join(checkpoint, LOCK_FILE)
+    while True:
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(path) as file:
+                    owner = int(file.read() or 0)
+            except (OSError, ValueError):
+                owner = 0
+            if owner and process_alive(owner):
+                raise ValueError(f"Checkpoint '{checkpoint}' is in use by process {owner}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(str(os.getpid()))
+        return path
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def open_checkpoint(checkpoint, settings, shape, num_tiles):
+    os.makedirs(checkpoint, exist_ok=True)
+    state_path = os.path.join(checkpoint, STATE_FILE)
+    lambda_path = os.path.join(checkpoint, LAMBDA_FILE)
+    done_path = os.path.join(checkpoint, DONE_FILE)
+    if os.path.exists(state_path):
+        with open(state_path) as file:
+            if json.load(file) != settings:
+                raise ValueError(f"Checkpoint '{checkpoint}' was written with different settings")
+        return np.load(lambda_path, mmap_mode='r+'), np.load(done_path, mmap_mode='r+')
+    stored = np.lib.format.open_memmap(lambda_path, mode='w+', dtype=np.float64, shape=shape)
+    stored[:] = np.nan
+    done = np.lib.format.open_memmap(done_path, mode='w+', dtype=bool, shape=(num_tiles,))
+    with open(state_path, 'w') as file:
+        json.dump(settings, file)
+    return stored, done
+
+
+def classify(plane, threshold=THRESHOLD):
+    classes = np.full(plane.shape, UNBOUNDED, dtype=np.int8)
+    finite = np.isfinite(plane)
+    classes[finite & (plane < -threshold)] = FIXED_POINT
+    classes[finite & (np.abs(plane) <= threshold)] = PERIODIC
+    classes[finite & (plane > threshold)] = CHAOTIC
+    return classes
+
+
+def default_plane(system, num_values=100):
+    name1, start1, stop1, name2, start2, stop2 = PLANES[system]
+    return name1, np.linspace(start1, stop1, num_values), name2, np.linspace(start2, stop2, num_values)
@@ -0,0 +1,87 @@
+import numpy as np
+
+DEFAULT_CHUNK = 50000
+NEWTON_ITERATIONS = 4
+AXES = {'x': 0, 'y': 1, 'z': 2}
+
+# Default sections as (axis, offset as a function of the constants, direction)
+SECTIONS = {
+    'lorenz': ('z', lambda constants: constants['rho'] - 1, -1),
+    'roessler': ('x', lambda constants: 0.0, 1),
+    'user': ('z', lambda constants: 0.0, 0),
+}
+
+
+def poincare_section(eq_handler, system, initial_conditions, t_start, t_end, num_steps, normal, offset,
+                     direction=0, transient_steps=0, chunk_size=DEFAULT_CHUNK):
+    # Crossings of the plane normal . xyz = offset, with direction 1 only upward (normal . dxyz > 0), -1 only
+    # downward and 0 both. The trajectory is integrated chunk by chunk and dropped again, only the crossings are
+    # kept, so memory grows with the number of section points and not with num_steps.
+    # Returns the crossing times t_start + (row + s) * dt and the (K, 3) crossing states.
+    normal = np.asarray(normal, dtype=float)
+    dt = (t_end - t_start) / num_steps
+    rhs = eq_handler.system_batch(system)
+    times = []
+    points = []
+    previous = None
+    first_row = 0
+    for _, xyz in eq_handler.runge_kutta_chunks(system, initial_conditions, t_start, t_end, num_steps, chunk_size):
+        # The last sample of the previous chunk is prepended so crossings between chunks are found as well
+        samples = xyz if previous is None else np.concatenate((previous, xyz))
+        rows, fractions, states = find_crossings(samples, rhs(samples), dt, normal, offset, direction)
+        rows += first_row
+        keep = rows >= transient_steps
+        times.append(t_start + (rows[keep] + fractions[keep]) * dt)
+        points.append(states[keep])
+        first_row += len(samples) - 1
+        previous = samples[-1:]
+    if not times:
+        return np.empty(0), np.empty((0, 3))
+    return np.concatenate(times), np.concatenate(points)
+
+
+def find_crossings(xyz, dxyz, dt, normal, offset, direction=0):
+    # Sign changes of g = normal . xyz - offset between consecutive rows, refined on the cubic Hermite
+    # interpolant built from the states and their derivatives, which matches the RK4 solution to O(dt^4)
+    g = xyz @ normal - offset
+    g0 = g[:-1]
+    g1 = g[1:]
+    if direction > 0:
+        crossed = (g0 < 0) & (g1 >= 0)
+    elif direction < 0:
+        crossed = (g0 > 0) & (g1 <= 0)
+    else:
+        crossed = ((g0 < 0) & (g1 >= 0)) | ((g0 > 0) & (g1 <= 0))
+    rows = np.flatnonzero(crossed)
+    p0 = xyz[rows]
+    p1 = xyz[rows + 1]
+    m0 = dxyz[rows] * dt
+    m1 = dxyz[rows + 1] * dt
+
+    # Newton on the cubic, started from the linear estimate and kept inside the step
+    s = g0[rows] / (g0[rows] - g1[rows])
+    for _ in range(NEWTON_ITERATIONS):
+        value, slope = hermite(p0, p1, m0, m1, s)
+        value = value @ normal - offset
+        slope = slope @ normal
+        safe = slope != 0
+        s = np.where(safe, s - value / np.where(safe, slope, 1.0), s)
+        s = np.clip(s, 0.0, 1.0)
+    states, _ = hermite(p0, p1, m0, m1, s)
+    return rows, s, states
+
+
+def hermite(p0, p1, m0, m1, s):
+    # Value and d/ds of the cubic Hermite curve through p0, p1 with scaled tangents m0, m1 at s in [0, 1]
+    s = s[:, None]
+    s2 = s * s
+    s3 = s2 * s
+    value = (2 * s3 - 3 * s2 + 1) * p0 + (s3 - 2 * s2 + s) * m0 + (-2 * s3 + 3 * s2) * p1 + (s3 - s2) * m1
+    slope = (6 * s2 - 6 * s) * p0 + (3 * s2 - 4 * s + 1) * m0 + (-6 * s2 + 6 * s) * p1 + (3 * s2 - 2 * s) * m1
+    return value, slope
+
+
+def axis_section(axis, value, direction):
+    normal = np.zeros(3)
+    normal[AXES[axis]] = 1.0
+    return normal, float(value), int(direction)
@@ -0,0 +1,50 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'CHAOSSN1'
+ALIGNMENT = 64
+WRITE_CHUNK = 1 << 20
+EXTENSION = '.chaos'
+
+# Layout of a session file: MAGIC, the JSON header length as little-endian uint64, the UTF-8 JSON header padded
+# with spaces so the trajectory starts on an ALIGNMENT boundary, then the raw row-major (N, 3) samples
+# in the float64 or float32 dtype named by the header.
+# Loading only parses the header and maps the samples, pages are read when something actually touches them.
+
+
+def save_session(path, settings, X, Y, Z):
+    count = len(X)
+    dtype = np.dtype(np.asarray(X[:0]).dtype).newbyteorder('<')
+    header = dict(settings, version=1, dtype=dtype.str, shape=[count, 3])
+    encoded = json.dumps(header).encode()
+    data_offset = -(-(len(MAGIC) + 8 + len(encoded)) // ALIGNMENT) * ALIGNMENT
+    encoded = encoded.ljust(data_offset - len(MAGIC) - 8)
+
+    # Written next to the target and moved over it, so saving onto a session that is currently mapped is safe
+    temporary = path + '.part'
+    with open(temporary, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<Q', len(encoded)))
+        file.write(encoded)
+        for start in range(0, count, WRITE_CHUNK):
+            stop = min(start + WRITE_CHUNK, count)
+            rows = np.column_stack((X[start:stop], Y[start:stop], Z[start:stop])).astype(dtype, copy=False)
+            file.write(rows.tobytes())
+    os.replace(temporary, path)
+    return header
+
+
+def load_session(path):
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a Chaos session file")
+        length, = struct.unpack('<Q', file.read(8))
+        header = json.loads(file.read(length).decode())
+    shape = tuple(header['shape'])
+    if shape[0] == 0:
+        return header, np.empty(shape)
+    xyz = np.memmap(path, dtype=np.dtype(header['dtype']), mode='r', offset=len(MAGIC) + 8 + length, shape=shape)
+    return header, xyz
@@ -0,0 +1,60 @@
+import numpy as np
+
+DEFAULT_SEGMENT = 4096
+MIN_SEGMENT = 16
+OVERLAP = 0.5
+BLOCK_ROWS = 1 << 20
+SEGMENT_BATCH = 64
+
+
+def segment_length(num_samples, segment=DEFAULT_SEGMENT):
+    # Largest power of two up to segment that still fits a run of num_samples at least once
+    fitting = 2 ** int(np.log2(max(num_samples, MIN_SEGMENT)))
+    return max(min(segment, fitting), MIN_SEGMENT)
+
+
+class Welch_Estimator():
+    # Averaged Hann-windowed periodograms of several equally sampled series, fed incrementally. Input is consumed in
+    # blocks of BLOCK_ROWS and transformed SEGMENT_BATCH segments at a time, only the unfinished segment is kept
+    # between updates, so memory does not depend on the length of the run.
+    def __init__(self, spacing, num_series=3, segment=DEFAULT_SEGMENT, overlap=OVERLAP):
+        self.spacing = spacing
+        self.segment = segment
+        self.step = max(int(segment * (1 - overlap)), 1)
+        self.window = np.hanning(segment + 1)[:-1]
+        self.power = np.zeros((num_series, segment // 2 + 1))
+        self.tail = np.empty((num_series, 0))
+        self.segments = 0
+        self.rows = 0
+
+    def update(self, columns):
+        count = len(columns[0])
+        for start in range(0, count, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, count)
+            self.consume(np.stack([np.asarray(column[start:stop], dtype=float) for column in columns]))
+        self.rows += count
+
+    def consume(self, block):
+        data = np.concatenate((self.tail, block), axis=1)
+        if data.shape[1] < self.segment:
+            self.tail = data
+            return
+        count = (data.shape[1] - self.segment) // self.step + 1
+        windows = np.lib.stride_tricks.sliding_window_view(data, self.segment, axis=1)[:, ::self.step][:, :count]
+        for start in range(0, count, SEGMENT_BATCH):
+            segments = windows[:, start:start + SEGMENT_BATCH]
+            # Every segment loses its own mean first, the attractor's offset would otherwise swamp the low bins
+            segments = (segments - segments.mean(axis=2, keepdims=True)) * self.window
+            spectrum = np.fft.rfft(segments, axis=2)
+            self.power += (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=1)
+        self.segments += count
+        self.tail = data[:, count * self.step:].copy()
+
+    def density(self):
+        # One-sided power spectral density, the same scaling as scipy.signal.welch(scaling='density')
+        frequencies = np.fft.rfftfreq(self.segment, self.spacing)
+        if not self.segments:
+            return frequencies, np.full(self.power.shape, np.nan)
+        psd = self.power * (self.spacing / (self.segments * np.sum(self.window ** 2)))
+        psd[:, 1:-1 if self.segment % 2 == 0 else None] *= 2
+        return frequencies, psd
@@ -0,0 +1,76 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+HISTORY = 50
+PROFILE_PATH = 'last_action.prof'
+PROFILE_LINES = 15
+
+
+class Stats_Store():
+    # Rolling (duration, steps, nbytes) samples per stage. Integrations record from worker threads, hence the lock.
+    def __init__(self, history=HISTORY):
+        self.history = history
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, duration, steps=0, nbytes=0):
+        with self.lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.history)
+            self.samples[stage].append((duration, steps, nbytes))
+
+    @contextmanager
+    def timed(self, stage, steps=0, nbytes=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, steps, nbytes)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def summary(self):
+        with self.lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+        if not samples:
+            return "No timings recorded yet"
+        lines = []
+        for stage, values in samples.items():
+            durations = [value[0] for value in values]
+            steps = sum(value[1] for value in values)
+            peak = max(value[2] for value in values)
+            line = f"{stage}: {len(values)}x, last {durations[-1] * 1000:.2f} ms, " \
+                   f"mean {sum(durations) / len(durations) * 1000:.2f} ms, max {max(durations) * 1000:.2f} ms"
+            if steps and sum(durations) > 0:
+                line += f", {steps / sum(durations):.0f} steps/s"
+            if peak:
+                line += f", peak {peak / 2 ** 20:.1f} MB"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def timed(store, stage, steps=0, nbytes=0):
+    # Lets instrumented code stay unconditional, without a store nothing is measured
+    if store is None:
+        return nullcontext()
+    return store.timed(stage, steps, nbytes)
+
+
+def profile_call(function, path=PROFILE_PATH, limit=PROFILE_LINES):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        function()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,110 @@
+import io
+import json
+import os
+
+import numpy as np
+
+from equation_handler import Eq_Handler
+
+DEFAULT_CHUNK = 100000
+
+
+def state_path(path):
+    return path + '.json'
+
+
+def read_state(path):
+    with open(state_path(path)) as file:
+        return json.load(file)
+
+
+def write_state(path, state):
+    temp = state_path(path) + '.tmp'
+    with open(temp, 'w') as file:
+        json.dump(state, file, indent=1)
+    os.replace(temp, state_path(path))
+
+
+def handler_from_state(state):
+    eq_handler = Eq_Handler()
+    if state['system'] == 'lorenz':
+        eq_handler.constantsl = dict(state['constants'])
+    else:
+        eq_handler.constantsr = dict(state['constants'])
+    return eq_handler
+
+
+def stream_to_file(eq_handler, system, initial_conditions, t_start, t_end, num_steps, path,
+                   chunk_size=DEFAULT_CHUNK):
+    # The trajectory goes straight into an .npy memmap, a JSON sidecar records the last written state so
+    # resume_stream can pick the run up again. Nothing is computed until the generator is iterated.
+    xyz = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(num_steps, 3))
+    constants = eq_handler.constantsl if system == 'lorenz' else eq_handler.constantsr
+    state = {
+        'system': system,
+        'constants': {name: float(value) for name, value in constants.items()},
+        't_start': float(t_start),
+        't_end': float(t_end),
+        'num_steps': int(num_steps),
+        'dt': (t_end - t_start) / num_steps,
+        'steps_done': 0,
+        'last_state': [float(value) for value in initial_conditions],
+    }
+    write_state(path, state)
+    return write_chunks(eq_handler, path, xyz, state, chunk_size)
+
+
+def resume_stream(path, eq_handler=None, extra_steps=0, chunk_size=DEFAULT_CHUNK):
+    # Continues an interrupted run, extra_steps grows the file so a finished run can be carried on further
+    state = read_state(path)
+    if eq_handler is None:
+        eq_handler = handler_from_state(state)
+    if extra_steps:
+        grow_npy(path, state['num_steps'] + extra_steps)
+        state['num_steps'] += extra_steps
+        state['t_end'] = state['t_start'] + state['dt'] * state['num_steps']
+        write_state(path, state)
+    xyz = np.load(path, mmap_mode='r+')
+    return write_chunks(eq_handler, path, xyz, state, chunk_size)
+
+
+def write_chunks(eq_handler, path, xyz, state, chunk_size):
+    chunks = eq_handler.runge_kutta_chunks(state['system'], state['last_state'], state['t_start'], state['t_end'],
+                                           state['num_steps'], chunk_size, state['steps_done'], state['dt'])
+    for t_chunk, xyz_chunk in chunks:
+        done = state['steps_done']
+        xyz[done:done + len(xyz_chunk)] = xyz_chunk
+        xyz.flush()
+        state['steps_done'] = done + len(xyz_chunk)
+        state['last_state'] = [float(value) for value in xyz_chunk[-1]]
+        write_state(path, state)
+        yield t_chunk, xyz_chunk
+
+
+def run_stream(chunks):
+    for _ in chunks:
+        pass
+
+
+def grow_npy(path, num_rows):
+    # Rows of a C-ordered (N, 3) array are contiguous, so growing the file only needs a new header
+    with open(path, 'r+b') as file:
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        offset = file.tell()
+        if fortran_order or len(shape) != 2:
+            raise ValueError(f"{path} is not a row-major trajectory file")
+        header = io.BytesIO()
+        fields = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (num_rows, shape[1])}
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(header, fields)
+        else:
+            np.lib.format.write_array_header_2_0(header, fields)
+        if header.tell() != offset:
+            raise ValueError(f"Header of {path} cannot grow in place")
+        file.seek(0)
+        file.write(header.getvalue())
+        file.truncate(offset + num_rows * shape[1] * dtype.itemsize)
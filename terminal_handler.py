@@ -1,34 +1,114 @@
+import os
 import sys
 
+import stats_handler as sth
+
 CommandList={}
+CommandTable = {}
+CommandNames = []
+HelpText = ""
+MAX_COMMAND_WORDS = 2
+MAX_HISTORY = 500
+
+
+def parse_options(args):
+    # "rho=28 sigma=10" -> {'rho': '28', 'sigma': '10'}
+    options = {}
+    for token in args.split():
+        if '=' not in token:
+            raise ValueError(f"Expected name=value, got '{token}'")
+        key, value = token.split('=', 1)
+        options[key] = value
+    return options
+
+
 class Term_handler():
     def __init__(self, main_frame):
         self.main_frame = main_frame
+        self.history = []
+        self.history_position = None
 
 
     def get_command(self, textedit, text):
-        commandcheck = 0
-        command = text.split('\n')
-        foundcom = self.get_last_non_empty_line(command)
-        if CommandList is not None:
-            num=0
-            while(num<=len(CommandList)-1):
-                if(foundcom == CommandList[num][0]):
-                    value = int(CommandList[num][1])
-                    print(value)
-                    self.check_command_type(value, textedit)
-                    commandcheck=1
-                    break
-                num += 1
-        if(commandcheck==0):
-            self.main_frame.print_onto_text_edit(f"ERROR: There is no such command as '{foundcom}'!")
-
-    def get_last_non_empty_line(self, lines):
-        for line in reversed(lines):
-            if line.strip():
-                return line
-
-    def check_command_type(self, commandNum, textedit):
+        # Only the tail of the buffer is looked at, however long the session has been
+        foundcom = text.rstrip().rsplit('\n', 1)[-1]
+        if not foundcom.strip():
+            return
+        self.execute_line(foundcom, textedit)
+
+    def submit(self, line, textedit=None):
+        line = line.strip()
+        self.history_position = None
+        if not line:
+            return False
+        if not self.history or self.history[-1] != line:
+            self.history.append(line)
+            del self.history[:-MAX_HISTORY]
+        return self.execute_line(line, textedit)
+
+    def previous_command(self):
+        if not self.history:
+            return None
+        position = len(self.history) if self.history_position is None else self.history_position
+        self.history_position = max(position - 1, 0)
+        return self.history[self.history_position]
+
+    def next_command(self):
+        # None while not browsing the history, '' after stepping past the newest entry
+        if self.history_position is None:
+            return None
+        self.history_position += 1
+        if self.history_position >= len(self.history):
+            self.history_position = None
+            return ''
+        return self.history[self.history_position]
+
+    def complete(self, text):
+        # Completes a command name, returns the new text and the names it was chosen from
+        prefix = text.lstrip()
+        matches = [name for name in CommandNames if name.startswith(prefix)]
+        if not matches:
+            return text, matches
+        if len(matches) == 1:
+            return matches[0] + ' ', matches
+        return os.path.commonprefix(matches), matches
+
+    def execute_line(self, line, textedit=None):
+        # Command names are at most MAX_COMMAND_WORDS long, so a couple of dict lookups replace the table scan
+        line = line.strip()
+        for count in range(MAX_COMMAND_WORDS, 0, -1):
+            parts = line.split(None, count)
+            name = ' '.join(parts[:count])
+            if len(parts) >= count and name in CommandTable:
+                value = CommandTable[name]
+                print(value)
+                with sth.timed(self.main_frame.stats, f'command {name}'):
+                    self.check_command_type(value, textedit, parts[count] if len(parts) > count else '')
+                return True
+        self.main_frame.print_onto_text_edit(f"ERROR: There is no such command as '{line}'!")
+        return False
+
+    def run_script(self, path):
+        if not path:
+            self.main_frame.print_onto_text_edit("Usage: run <script file>")
+            return
+        try:
+            with open(path) as file:
+                lines = file.readlines()
+        except OSError as error:
+            self.main_frame.print_onto_text_edit(f"ERROR: Cannot read script '{path}': {error.strerror}")
+            return
+        # Every canvas update issued by the script is held back and drawn once when the script ends
+        self.main_frame.begin_batch()
+        try:
+            for line in lines:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    self.execute_line(line)
+        finally:
+            self.main_frame.end_batch()
+
+    def check_command_type(self, commandNum, textedit, args=''):
         print("looking for method")
         if commandNum == 0:
             sys.exit()
@@ -38,20 +118,52 @@ class Term_handler():
             print("2dplot")
         elif commandNum == 3:
             print("3dplot")
+        elif commandNum == 4:
+            self.main_frame.plot_system('lorenz', args)
+        elif commandNum == 5:
+            self.main_frame.plot_system('roessler', args)
+        elif commandNum == 6:
+            self.main_frame.load_from_file(args.strip())
         elif commandNum == 7:
             self.main_frame.show_equation()
+        elif commandNum == 8:
+            self.main_frame.save_to_file(args.strip())
+        elif commandNum == 9:
+            self.main_frame.set_user_equation(args)
         elif commandNum==10:
             self.main_frame.clear_terminal()
         elif commandNum==11:
             self.main_frame.clear_info()
         elif commandNum==12:
-            self.main_frame.print_onto_text_edit("List of console commands: \n")
-            for i in CommandList:
-                self.main_frame.print_onto_text_edit(CommandList[i][0])
-                print(CommandList[i][0])
+            self.main_frame.print_onto_text_edit(HelpText)
+        elif commandNum == 13:
+            self.main_frame.show_bifurcation()
+        elif commandNum == 14:
+            self.main_frame.show_lyapunov()
+        elif commandNum == 15:
+            self.run_script(args)
+        elif commandNum == 16:
+            self.main_frame.show_stats(args)
+        elif commandNum == 17:
+            self.main_frame.profile_command(args.strip())
+        elif commandNum == 18:
+            self.main_frame.show_poincare(args)
+        elif commandNum == 19:
+            self.main_frame.set_spectrum_mode(args)
+        elif commandNum == 20:
+            self.main_frame.show_parameter_plane(args)
+        elif commandNum == 21:
+            self.main_frame.show_dimension(args)
+        elif commandNum == 22:
+            self.main_frame.show_recurrence(args)
+        elif commandNum == 23:
+            self.main_frame.start_animation(args)
+        elif commandNum == 24:
+            self.main_frame.show_density(args)
         else:
             print("some debug bullshit")
     def load_command_base(self):
+        global HelpText
         file = open("command_list.txt")
         linenum = 0
         while True:
@@ -69,10 +181,13 @@ class Term_handler():
                     CommandList.get(linenum, ("", 0))[0] + temparr[0],
                     CommandList.get(linenum, ("", 0))[1] + int(temparr[1])
                 )
+                CommandTable[CommandList[linenum][0]] = CommandList[linenum][1]
                 linenum += 1
             else:
                 print(f"Ignoring invalid line: {line.strip()}")
         file.close()
+        CommandNames[:] = sorted(CommandTable)
+        HelpText = "List of console commands: \n\n" + "\n".join(CommandList[i][0] for i in CommandList)
 
     # def get_User_Equation2d(self):
     #     equation = self.main_frame.get_user_Equation()
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+
+
+@pytest.fixture(scope='module')
+def frame():
+    os.chdir(ROOT)
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    import main
+    frame = main.MainFrame()
+    # Let the integration queued at startup finish before the test starts its own
+    app.processEvents()
+    while frame.runner.is_running():
+        app.processEvents()
+    yield frame
+    frame.close()
+
+
+def test_every_task_of_a_script_reports(frame, tmp_path):
+    script = tmp_path / 'tasks.txt'
+    # Plotting clears the info panel, so all tasks run on one trajectory
+    script.write_text('plot Lorenz\nlyapunov\npoincare\nrecurrence n=500\nlyapunov\nlyapunov\n')
+    frame.info_edit.clear()
+    frame.term_handler.execute_line(f'run {script}')
+    text = frame.info_edit.toPlainText()
+    assert text.count('Lyapunov spectrum:') == 3
+    assert 'Poincaré section:' in text
+    assert 'Recurrence rate:' in text
+    assert 'ERROR' not in text
+    assert not frame.task_runner.blocking
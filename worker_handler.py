@@ -0,0 +1,245 @@
+import threading
+import time
+
+import numpy as np
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+PROGRESS_INTERVAL = 0.25
+
+
+class Integration_Worker(QObject):
+    chunk_ready = pyqtSignal(int, object, object)
+    finished = pyqtSignal(int)
+    failed = pyqtSignal(int, object)
+
+    def __init__(self, run_id, chunks):
+        super(Integration_Worker, self).__init__()
+        self.run_id = run_id
+        self.chunks = chunks
+        self.cancelled = False
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            for t_chunk, xyz_chunk in self.chunks:
+                if self.cancelled:
+                    break
+                self.chunk_ready.emit(self.run_id, t_chunk, xyz_chunk)
+        except Exception as error:
+            self.failed.emit(self.run_id, error)
+            return
+        self.finished.emit(self.run_id)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Integration_Runner(QObject):
+    # progress carries the filled part of the time grid and views of the trajectory, they grow until finished is
+    # emitted. Timestamps come from the grid given to start, the t pieces of the chunks are not copied.
+    progress = pyqtSignal(object, object)
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super(Integration_Runner, self).__init__(parent)
+        self.run_id = 0
+        self.worker = None
+        self.threads = []
+        self.time_grid = []
+        self.xyz = np.empty((0, 3))
+        self.filled = 0
+        self.last_progress = 0.0
+
+    def start(self, chunks, time_grid, dtype=np.float64):
+        self.cancel()
+        self.run_id += 1
+        self.time_grid = time_grid
+        self.xyz = np.empty((len(time_grid), 3), dtype=dtype)
+        self.filled = 0
+        self.last_progress = time.monotonic()
+
+        thread = QThread()
+        worker = Integration_Worker(self.run_id, chunks)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.chunk_ready.connect(self.on_chunk_ready)
+        worker.finished.connect(self.on_worker_finished)
+        worker.failed.connect(self.on_worker_failed)
+        worker.finished.connect(thread.quit)
+        worker.failed.connect(thread.quit)
+        thread.finished.connect(lambda: self.release(thread))
+        self.threads.append((thread, worker))
+        self.worker = worker
+        thread.start()
+
+    def release(self, thread):
+        self.threads = [pair for pair in self.threads if pair[0] is not thread]
+
+    def is_running(self):
+        return self.worker is not None
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    def shutdown(self):
+        self.cancel()
+        for thread, worker in list(self.threads):
+            worker.cancel()
+            thread.quit()
+            thread.wait()
+
+    @pyqtSlot(int, object, object)
+    def on_chunk_ready(self, run_id, t_chunk, xyz_chunk):
+        if run_id != self.run_id or self.worker is None:
+            return
+        count = len(xyz_chunk)
+        self.xyz[self.filled:self.filled + count] = xyz_chunk
+        self.filled += count
+        if time.monotonic() - self.last_progress >= PROGRESS_INTERVAL:
+            self.emit_progress()
+
+    @pyqtSlot(int)
+    def on_worker_finished(self, run_id):
+        if run_id != self.run_id or self.worker is None:
+            return
+        self.worker = None
+        self.emit_progress()
+        self.finished.emit()
+
+    @pyqtSlot(int, object)
+    def on_worker_failed(self, run_id, error):
+        # The samples that did arrive stay plotted, the run just ends early
+        if run_id != self.run_id or self.worker is None:
+            return
+        self.worker = None
+        self.emit_progress()
+        self.failed.emit(f"ERROR: {error}")
+
+    def emit_progress(self):
+        self.last_progress = time.monotonic()
+        self.progress.emit(self.time_grid[:self.filled], self.xyz[:self.filled])
+
+
+class Task_Worker(QObject):
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, object)
+    progress = pyqtSignal(int, str)
+
+    def __init__(self, run_id, task, cancellable=False):
+        super(Task_Worker, self).__init__()
+        self.run_id = run_id
+        self.task = task
+        self.cancellable = cancellable
+        self.cancel_event = threading.Event()
+
+    def report(self, text):
+        # Called from the task's thread, the signal is queued to the runner in the GUI thread
+        self.progress.emit(self.run_id, text)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            if self.cancellable:
+                result = self.task(self.cancel_event, self.report)
+            else:
+                result = self.task()
+        except Exception as error:
+            self.failed.emit(self.run_id, error)
+            return
+        self.finished.emit(self.run_id, result)
+
+
+class Task_Runner(QObject):
+    # Runs one-shot computations (sweeps, maps) off the event loop, a new task supersedes the pending one.
+    # Cancellable tasks are called as task(cancel_event, report) and are expected to stop soon after cancel_event is
+    # set, report(text) shows up as progress of the current task. While blocking is set (scripts) tasks run inline
+    # instead, so every task of a script reports its result rather than superseding the one before it.
+    failed = pyqtSignal(str)
+    progress = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super(Task_Runner, self).__init__(parent)
+        self.run_id = 0
+        self.callback = None
+        self.worker = None
+        self.threads = []
+        self.blocking = False
+
+    def start(self, task, callback, cancellable=False):
+        self.cancel()
+        self.run_id += 1
+        if self.blocking:
+            self.run_inline(task, callback, cancellable)
+            return
+        self.callback = callback
+        thread = QThread()
+        worker = Task_Worker(self.run_id, task, cancellable)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.finished.connect(self.on_worker_finished)
+        worker.failed.connect(self.on_worker_failed)
+        worker.progress.connect(self.on_worker_progress)
+        worker.finished.connect(thread.quit)
+        worker.failed.connect(thread.quit)
+        thread.finished.connect(lambda: self.release(thread))
+        self.threads.append((thread, worker))
+        self.worker = worker
+        thread.start()
+
+    def run_inline(self, task, callback, cancellable):
+        try:
+            result = task(threading.Event(), self.progress.emit) if cancellable else task()
+            callback(result)
+        except Exception as error:
+            self.failed.emit(f"ERROR: {error}")
+
+    def release(self, thread):
+        self.threads = [pair for pair in self.threads if pair[0] is not thread]
+
+    def is_running(self):
+        return self.callback is not None
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        self.callback = None
+
+    def shutdown(self):
+        self.cancel()
+        for thread, worker in list(self.threads):
+            worker.cancel()
+            thread.quit()
+            thread.wait()
+
+    @pyqtSlot(int, str)
+    def on_worker_progress(self, run_id, text):
+        if run_id == self.run_id and self.callback is not None:
+            self.progress.emit(text)
+
+    @pyqtSlot(int, object)
+    def on_worker_finished(self, run_id, result):
+        if run_id != self.run_id or self.callback is None:
+            return
+        callback = self.callback
+        self.callback = None
+        self.worker = None
+        # An exception escaping this slot would abort the whole application
+        try:
+            callback(result)
+        except Exception as error:
+            self.failed.emit(f"ERROR: {error}")
+
+    @pyqtSlot(int, object)
+    def on_worker_failed(self, run_id, error):
+        if run_id != self.run_id or self.callback is None:
+            return
+        self.callback = None
+        self.worker = None
+        self.failed.emit(f"ERROR: {error}")